@@ -1,6 +1,9 @@
 ; Read the file in and assign it to the 'param' variable;
 ; assign the header information to variables for use later.
 klist='/Users/dhu/Github/RAPYUTA/tests/out/kernelist.csv' ; /path/of/csv/file/storing/kernel/list
+; or given on the command line: idl conv.pro -args /path/of/csv/file
+args = COMMAND_LINE_ARGS(COUNT=nargs)
+IF nargs GT 0 THEN klist = args[0]
 param = READ_CSV(klist, N_TABLE_HEADER=1)
 ; HELP, param, /STRUCTURES
 im_file = param.FIELD1
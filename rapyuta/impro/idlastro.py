@@ -14,8 +14,10 @@ See also impro.irebin
 
 import os
 from pathlib import Path
+from functools import lru_cache
 import subprocess as SP
 import numpy as np
+from astropy.io import fits
 
 ## Local
 import rapyuta.utbox as UT
@@ -37,8 +39,19 @@ def hextract(oldim, oldhd, x0, x1, y0, y1):
 
     return newim, newhd
 
+@lru_cache(maxsize=128)
+def _pixel_fov(hdrstr):
+    '''
+    Pixel field of view of a header (cached by header string,
+    the same refheader is often reused for a batch of frames)
+    '''
+    cdelt = IO.get_pc(wcs=IO.patch_wcs_3D(
+        header=fits.Header.fromstring(hdrstr)).wcs).cdelt
+
+    return abs(cdelt[0]*cdelt[1])
+
 def hswarp(oldimage, oldheader, refheader,
-           keepedge=False, tmpdir=None, verbose=True):
+           keepedge=False, tmpdir=None, shm=False, verbose=True):
     '''
     Python version of hswarp (IDL), 
     a SWarp drop-in replacement for hastrom, 
@@ -49,7 +62,9 @@ def hswarp(oldimage, oldheader, refheader,
     oldheader           header object
     refheader           ref header
     keepedge            default: False
-    tmpdir              default: None
+    tmpdir              default: None (removed after use)
+    shm                 tmp files in RAM if tmpdir is None
+                          (/dev/shm, see UT.localbuff. Default: False)
     verbose             default: True
     ------ OUTPUT ------
     ds                  output object
@@ -65,8 +80,12 @@ def hswarp(oldimage, oldheader, refheader,
     ds = type('', (), {})()
 
     ## Set path of tmp files
-    UT.maketmp(os.getcwd()+'/tmp_hswarp')
-    path_tmp = UT.fclean(tmpdir+'/coadd*')
+    if tmpdir is None:
+        path_tmp = UT.localbuff('tmp_hswarp', shm=shm)
+    else:
+        path_tmp = tmpdir+'/'
+    UT.maketmp(path_tmp)
+    UT.fclean(path_tmp+'coadd*')
     ## Make input
     IO.write_fits(path_tmp+'old', oldheader, oldimage)
     with open(path_tmp+'coadd.head', 'w') as f:
@@ -89,52 +108,38 @@ def hswarp(oldimage, oldheader, refheader,
     ## Add back in the edges because LANCZOS3 kills the edges
     ## Do it in steps of less and less precision
     if keepedge==True:
-        oldweight = IO.read_fits(path_tmp+'coadd.weight').data
-        if np.sum(oldweight==0)!=0:
-            SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE LANCZOS2 '+' old.fits',
+        ## coadd & coadd.weight read once per SWarp run
+        ## (new zero mask of one step is the old zero mask of the next)
+        oldzero = IO.read_fits_data(path_tmp+'coadd.weight')==0
+        for resampling in ['LANCZOS2', 'BILINEAR', 'NEAREST']:
+            if not oldzero.any():
+                break
+            SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE '+resampling+' old.fits',
                     shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-            edgeimage = IO.read_fits(path_tmp+'coadd').data
-            newweight = IO.read_fits(path_tmp+'coadd.weight').data
-            edgeidx = np.logical_and(oldweight==0, newweight!=0)
+            edgeimage = IO.read_fits_data(path_tmp+'coadd')
+            newzero = IO.read_fits_data(path_tmp+'coadd.weight')==0
+            ## old zero & new non-zero weight (masks reused, one pass)
+            edgeidx = np.greater(oldzero, newzero)
             if edgeidx.any():
-                newimage[edgeidx] = edgeimage[edgeidx]
-
-            oldweight = IO.read_fits(path_tmp+'coadd.weight').data
-            if np.sum(oldweight==0)!=0:
-                SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE BILINEAR '+' old.fits',
-                        shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-                edgeimage = IO.read_fits(path_tmp+'coadd').data
-                newweight = IO.read_fits(path_tmp+'coadd.weight').data
-                edgeidx = np.logical_and(oldweight==0, newweight!=0)
-                if edgeidx.any():
-                    newimage[edgeidx] = edgeimage[edgeidx]
-
-                oldweight = IO.read_fits(path_tmp+'coadd.weight').data
-                if np.sum(oldweight==0)!=0:
-                    SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE NEAREST '+' old.fits',
-                            shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-                    edgeimage = IO.read_fits(path_tmp+'coadd').data
-                    newweight = IO.read_fits(path_tmp+'coadd.weight').data
-                    edgeidx = np.logical_and(oldweight==0, newweight!=0)
-                    if edgeidx.any():
-                        newimage[edgeidx] = edgeimage[edgeidx]
+                np.copyto(newimage, edgeimage, where=edgeidx)
+            oldzero = newzero
 
     ## SWarp is conserving surface brightness/pixel
     ## while the pixels size changes
-    oldcdelt = IO.get_pc(wcs=IO.patch_wcs_3D(header=oldheader).wcs).cdelt
-    refcdelt = IO.get_pc(wcs=IO.patch_wcs_3D(header=refheader).wcs).cdelt
-    old_pixel_fov = abs(oldcdelt[0]*oldcdelt[1])
-    new_pixel_fov = abs(refcdelt[0]*refcdelt[1])
+    old_pixel_fov = _pixel_fov(oldheader.tostring())
+    new_pixel_fov = _pixel_fov(refheader.tostring())
     newimage = newimage * old_pixel_fov/new_pixel_fov
     newimage[newimage==0] = np.nan
     # print('-------------------')
     # print(old_pixel_fov/new_pixel_fov)
-    IO.write_fits(path_tmp+'new', newheader, newimage)
     # print('-------------------')
     
     ## Delete tmp file if tmpdir was not specified
+    ## (new.fits only kept in tmpdir)
     if tmpdir is None:
         UT.fclean(path_tmp)
+    else:
+        IO.write_fits(path_tmp+'new', newheader, newimage)
 
     ds.data = newimage
     ds.header = newheader
@@ -14,7 +14,7 @@ Image processing
     igroupixel(improve)
     ismooth(improve)
     imontage(improve)
-        reproject, reproject_mc, coadd, clean
+        astype, reproject, reproject_mc, coadd, clean
     iswarp(improve):
         footprint, combine, combine_mc, clean
     iconvolve(improve):
@@ -27,11 +27,15 @@ Image processing
 
 from tqdm import tqdm, trange
 import os
+import copy
+import shutil
+import inspect
 import math
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from scipy.interpolate import interp1d
 from astropy import wcs
-from astropy.io import ascii
+from astropy.io import fits, ascii
 from astropy.table import Table
 from reproject import reproject_interp, reproject_exact, reproject_adaptive
 from reproject.mosaicking import reproject_and_coadd
@@ -47,6 +51,7 @@ import rapyuta.latte as LA
 import rapyuta.maths as MA
 from rapyuta.inout import fitsext, csvext, ascext, savext
 from .utils import *
+from .idlastro import _pixel_fov
 
 
 ##------------------------------------------------
@@ -78,11 +83,15 @@ class Jy_per_pix_to_MJy_per_sr(improve):
 
         ## gmean( Jy/MJy / sr/pix )
         ufactor = np.sqrt(np.prod(1.e-6/MA.pix2sr(1., self.cdelt)))
-        self.images = self.images * ufactor
+        if filIN is not None and np.issubdtype(self.images.dtype, np.floating):
+            ## Read data (copy-on-write): scaled in place, at native width
+            self.images *= self.images.dtype.type(ufactor)
+        else:
+            self.images = self.images * ufactor # input array unchanged
         self.header['BUNIT'] = 'MJy/sr'
 
         if filOUT is not None:
-            IO.write_fits(filOUT=filOUT, header=self.header, data=self.images,
+            IO.write_fits(filOUT, header=self.header, data=self.images,
                           wave=self.wave, wmod=self.wmod, filext=self.filext)
 
 class iuncert(improve):
@@ -144,7 +153,12 @@ class iptg(improve):
                          filUNC=filUNC, verbose=verbose, filext=filext,
                          instr=instr, instr_auto=instr_auto)
 
-        oldimage = self.images
+        ## No pointing error: no shift, no NaN repair
+        if accrand==0 and not swarp:
+            return
+
+        ## Original NaN mask (images may be resampled in place)
+        mask_nan = np.isnan(self.images)
 
         ## Resampling
         if swarp:
@@ -158,16 +172,12 @@ class iptg(improve):
                               combtype='avg', keepedge=True)
             self.images = rep.data
         else:
-            self.rand_pointing()
-
-        ## Original NaN mask
-        mask_nan = np.isnan(oldimage)
-        self.images[mask_nan] = np.nan
-        ## Recover new NaN pixels with zeros
-        mask_recover = np.logical_and(np.isnan(self.images), ~mask_nan)
-        self.images[mask_recover] = 0
-        
-    return self.images
+            self.rand_pointing(accrand, filltype=fill)
+
+        ## Recover new NaN pixels with zeros, then restore original NaNs
+        ## (two in-place masked stores)
+        np.copyto(self.images, 0., where=np.isnan(self.images))
+        np.copyto(self.images, np.nan, where=mask_nan)
 
 class islice(improve):
     '''
@@ -301,20 +311,35 @@ class imontage(improve):
     '''
     2D image or 3D cube montage toolkit
     Based on reproject v0.7.1 or later
+    (v0.11 or later for cube coadd, parallel and block_size)
 
     ------ INPUT ------
     reproject_function  resampling algorithms
-                          'interp': fastest (Default)
+                          'interp': bilinear (Default)
                           'exact': slowest
                           'adaptive': DeForest2004
-    tmpdir              tmp file path
+                          'fast': bilinear, celestial axes only
+                                  (map_coordinates, pixel mapping cached)
+    tmpdir              tmp file path (Default: None - UT.localbuff)
+    shm                 default tmp files in RAM (/dev/shm, see UT.localbuff)
+                          (Default: False - cwd/tmp_mtg/)
     verbose             (Default: False)
+    parallel            reproject in parallel (Default: False)
+                          True - all CPUs
+                          int - number of processes
+                          (dropped in multi-threaded file/MC loops,
+                           see func_kwargs)
+    block_size          output tile size (y, x) for blocked reprojection
+                          (Default: None - whole frame at once)
+    dtype               working and output dtype, e.g. np.float32
+                          (Default: None - as read, float64 outputs)
     ------ OUTPUT ------
     '''
     def __init__(self, reproject_function='interp',
-                 tmpdir=None, verbose=False):
+                 tmpdir=None, shm=False, verbose=False,
+                 parallel=False, block_size=None, dtype=None):
         '''
-        self: func, path_tmp, verbose
+        self: func, func_kw, dtype, path_tmp, verbose
         '''
         if reproject_function=='interp':
             self.func = reproject_interp
@@ -322,17 +347,33 @@ class imontage(improve):
             self.func = reproject_exact
         elif reproject_function=='adaptive':
             self.func = reproject_adaptive
+        elif reproject_function=='fast':
+            self.func = reproject_fast
         else:
             UT.strike('imontage', 'unknown reprojection algorithm.',
                       cat='InputError')
+
+        ## Blocked/parallel reprojection (reproject v0.11 or later)
+        ## Only passed if set, to keep older reproject working
+        self.func_kw = {}
+        if parallel:
+            self.func_kw['parallel'] = parallel
+        if block_size is not None:
+            self.func_kw['block_size'] = block_size
+        ## Footprint skipped where unused (reproject v0.8 or later)
+        self.footprint_kw = {}
+        if 'return_footprint' in inspect.signature(self.func).parameters:
+            self.footprint_kw['return_footprint'] = False
+
+        ## Working dtype (float32 halves memory traffic and BITPIX=-32 outputs)
+        self.dtype = dtype
         
         ## Set path of tmp files
         if tmpdir is None:
-            path_tmp = os.getcwd()+'/tmp_mtg/'
+            path_tmp = UT.localbuff('tmp_mtg', shm=shm)
         else:
             path_tmp = tmpdir
-        if not os.path.exists(path_tmp):
-            os.makedirs(path_tmp)
+        os.makedirs(path_tmp, exist_ok=True)
         self.path_tmp = path_tmp
 
         ## Verbose
@@ -343,80 +384,283 @@ class imontage(improve):
         self.verbose = verbose
         self.devnull = devnull
     
+    def astype(self, arr=None):
+        '''
+        Cast arr (Default: None - self.images and self.unc)
+        to the working dtype, if set
+        '''
+        if arr is not None:
+            if self.dtype is None:
+                return arr
+            else:
+                return np.asarray(arr, dtype=self.dtype)
+        elif self.dtype is not None:
+            self.images = np.asarray(self.images, dtype=self.dtype)
+            if self.unc is not None:
+                self.unc = np.asarray(self.unc, dtype=self.dtype)
+    
+    def func_kwargs(self, serial=False):
+        '''
+        Options of self.func (func_kw)
+        serial - without parallel, for calls from worker threads
+                 (no Nworkers * reproject processes oversubscription)
+        '''
+        if serial:
+            return {k: v for k, v in self.func_kw.items() if k!='parallel'}
+        else:
+            return self.func_kw
+    
+    def func_image(self, input_data, output_projection, serial=False, **kwargs):
+        '''
+        Reprojected array only (self.func without footprint)
+        serial - see func_kwargs
+        '''
+        kwargs.update(self.func_kwargs(serial))
+        if self.footprint_kw:
+            return self.func(input_data, output_projection,
+                             **self.footprint_kw, **kwargs)
+        else:
+            return self.func(input_data, output_projection, **kwargs)[0]
+    
+    def keep_input(self, rep):
+        '''
+        Set the <improve> inputs of self (filIN, header, images, wave, unc)
+        and their derived dims/WCS to those of rep,
+        a copy of self initialised with one input file
+        (rng, tmp path and reprojection settings stay with self)
+        '''
+        self.filIN = rep.filIN
+        self.header = rep.header
+        self.images = rep.images
+        self.wave = rep.wave
+        self.whdr = rep.whdr
+        self.unc = rep.unc
+        self.wcs = rep.wcs
+        self.Ndim = rep.Ndim
+        self.Nx, self.Ny, self.Nw = rep.Nx, rep.Ny, rep.Nw
+    
+    def func_header(self, images, header, refheader, **kwargs):
+        '''
+        Reprojected array only, input given as images and header
+        (WAVE-TAB cubes, whose table is not in the header:
+         celestial WCS broadcast along wavelength, as in read_fits)
+        '''
+        try:
+            wcs.WCS(header)
+            wcs.WCS(refheader)
+        except ValueError:
+            if refheader['NAXIS']==3 and refheader['NAXIS3']!=images.shape[0]:
+                UT.strike('imontage', 'WAVE-TAB cube reprojected to another wavelength grid.',
+                          cat='InputError')
+            shape_out = images.shape[:-2]+(refheader['NAXIS2'], refheader['NAXIS1'])
+            return self.func_image((images, IO.patch_wcs_3D(header=header).wcs),
+                                   IO.patch_wcs_3D(header=refheader).wcs,
+                                   shape_out=shape_out, **kwargs)
+
+        return self.func_image((images, header), refheader, **kwargs)
+    
     def reproject(self, flist, refheader, filOUT=None,
-                  dist=None, acc_ptg=0, fill_ptg='near') :
+                  dist=None, acc_ptg=0, fill_ptg='near', seed=None,
+                  Nworkers=None):
         '''
         Reproject 2D image or 3D cube
 
         ------ INPUT ------
         flist               FITS files to reproject
         refheader           reprojection header
-        filOUT              output FITS file
+        filOUT              output FITS file of the last input
+                              (Default: None - path_tmp+filename+'_rep'
+                               for each input)
         acc_ptg             pointing accuracy in arcsec (Default: 0)
         fill_ptg            fill value of no data regions after shift
                               'med': axis median
                               'avg': axis average
                               'near': nearest non-NaN value on the same axis (default)
                               float: constant
+        seed                seed of the random errors (Default: None)
+        Nworkers            number of threads (Default: None - half of CPUs)
         ------ OUTPUT ------
         newimage            reprojected images
+
+        Files are independent: each one is read and reprojected
+        in a thread on its own copy of self
+        (self keeps the inputs of the last file, see keep_input)
         '''
         flist = LA.listize(flist)
-
-        newimage = []
-        for fname in flist:
-            ## Set tmp and out
-            filename = os.path.basename(fname)
-            if filOUT is None:
-                filOUT = self.path_tmp+filename+'_rep'
-
-            super().__init__(fname)
+        seeds = np.random.SeedSequence(seed).spawn(len(flist))
+
+        def reproject_file(fname, sd):
+            rep = copy.copy(self)
+            improve.__init__(rep, fname, seed=sd)
+            if dist=='splitnorm':
+                rep.reinit(filUNC=[fname+'_unc_N'+fitsext, fname+'_unc_P'+fitsext])
+            rep.astype()
             
             ## Uncertainty propagation
             if dist=='norm':
-                self.rand_norm()
+                rep.rand_norm()
             elif dist=='splitnorm':
-                self.reinit(fname,
-                            filUNC=[fname+'_unc_N', fname+'_unc_P'])
-                self.rand_splitnorm()
-            self.rand_pointing(acc_ptg, fill=fill_ptg)
-            IO.write_fits(filOUT, self.header, self.images, self.wave, wmod=0)
+                rep.rand_splitnorm()
+            if acc_ptg>0:
+                rep.rand_pointing(acc_ptg, filltype=fill_ptg)
             
             ## Do reprojection
             ##-----------------
-            im = self.func(filOUT+fitsext, refheader)[0]
-            newimage.append(im)
+            ## In-memory handoff (no tmp FITS round-trip)
+            im = rep.astype(rep.func_header(rep.images, rep.header, refheader,
+                                            serial=(Nthreads>1)))
+            if filOUT is None:
+                IO.write_fits(self.path_tmp+os.path.basename(fname)+'_rep',
+                              refheader, im, rep.wave, wmod=0,
+                              COMMENT="Reprojected by <imontage>. ")
+
+            return rep, im
+
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
+        Nthreads = min(Nworkers, len(flist))
+        with ThreadPoolExecutor(max_workers=Nthreads) as executor:
+            reps = list(executor.map(reproject_file, flist, seeds))
+        newimage = [im for rep, im in reps]
+
+        ## self keeps the last input, as the sequential loop did
+        self.keep_input(reps[-1][0])
     
+        if filOUT is not None:
             comment = "Reprojected by <imontage>. "
-            IO.write_fits(filOUT, refheader, im, self.wave, wmod=0,
+            IO.write_fits(filOUT, refheader, newimage[-1], self.wave, wmod=0,
                        COMMENT=comment)
         
         return newimage
 
     def reproject_mc(self, filIN, refheader, filOUT=None,
-                     dist=None, acc_ptg=0, fill_ptg='near', Nmc=0):
+                     dist=None, acc_ptg=0, fill_ptg='near', Nmc=0,
+                     seed=None, Nworkers=None, mcmod=0, Nbatch=8):
         '''
         Generate Monte-Carlo uncertainties for reprojected input file
+
+        mcmod               MC realisation outputs (Default: 0)
+                              0 - one file per realisation (filOUT_j)
+                              1 - all in one file (filOUT_mc, axis 0: j)
+
+        MC realisations are independent: each one runs in a thread
+        on its own copy of self with its own random stream
+        (seed - seed of the MC streams; Nworkers - number of threads)
+        filIN and its uncertainties are read once,
+        and the errors are drawn in the MC loop (rand_batch),
+        and the tasks are submitted through a window of Nworkers
+        (bounded_map), so that at most about Nworkers*Nbatch
+        realisations are in memory
+        Without pointing errors (acc_ptg=0) all realisations share the
+        input WCS: they are reprojected in batches of Nbatch,
+        the pixel mapping being computed once per batch
         '''
         ds = type('', (), {})()
 
-        hyperim = [] # [j,(w,)y,x]
-        for j in trange(Nmc+1, leave=False,
-                        desc='<imontage> Reprojection [MC]'):
-
-            if j==0:
-                im0 = self.reproject(filIN, refheader, filOUT)[0]
+        ## Read input once
+        super().__init__(filIN, seed=seed)
+        if dist=='splitnorm':
+            self.reinit(filUNC=[filIN+'_unc_N'+fitsext, filIN+'_unc_P'+fitsext])
+        self.astype()
+        
+        im0 = self.astype(self.func_header(self.images, self.header, refheader))
+        if filOUT is not None:
+            IO.write_fits(filOUT, refheader, im0, self.wave, wmod=0,
+                       COMMENT="Reprojected by <imontage>. ")
+
+        ## Errors of realisations jlist [j,(w,)y,x]
+        ## (one seed, realisation j does not depend on the batches)
+        if dist in ['norm', 'splitnorm']:
+            mcseed = self.rng.integers(2**63)
+        def rand_mc(jlist):
+            return self.rand_batch([j-1 for j in jlist], dist=dist,
+                                   seed=mcseed, Nworkers=1)
+
+        seeds = np.random.SeedSequence(seed).spawn(Nmc)
+        def realise(j):
+            rep = copy.copy(self)
+            rep.rng = np.random.default_rng(seeds[j-1])
+            if dist in ['norm', 'splitnorm']:
+                rep.images = rand_mc([j])[0]
+            else:
+                rep.images = self.images.copy()
+            if acc_ptg>0:
+                rep.rand_pointing(acc_ptg, filltype=fill_ptg)
+            im = rep.astype(rep.func_header(rep.images, rep.header, refheader,
+                                            serial=(Nworkers>1)))
+            if filOUT is not None and mcmod==0:
+                IO.write_fits(filOUT+'_'+str(j), refheader, im, self.wave, wmod=0,
+                           COMMENT="Reprojected by <imontage>. ")
+            return im
+
+        im0 = np.asarray(im0)
+
+        ## Shared pixel mapping: same WCS for all realisations and
+        ## same wavelength grid (celestial WCS broadcast along w and j)
+        share_map = (acc_ptg==0)
+        if share_map and self.Ndim==3 and refheader['NAXIS']==3:
+            share_map = (refheader['NAXIS3']==self.Nw)
+            try:
+                wref = wcs.WCS(refheader).sub([3])
+                win = wcs.WCS(self.header).sub([3])
+            except ValueError:
+                ## WAVE-TAB: same grid, as assumed by func_header
+                pass
             else:
-                hyperim.append( self.reproject(filIN, refheader, filOUT+'_'+str(j),
-                                               dist, acc_ptg, fill_ptg)[0] )
-        im0 = np.array(im0)
-        hyperim = np.array(hyperim)
-        unc = np.nanstd(hyperim, axis=0)
+                pix = np.arange(self.Nw)
+                share_map = (share_map and
+                             np.allclose(wref.wcs_pix2world(pix, 0),
+                                         win.wcs_pix2world(pix, 0)))
+        if share_map:
+            wcs_in = IO.patch_wcs_3D(header=self.header).wcs
+            wcs_out = IO.patch_wcs_3D(header=refheader).wcs
+        def realise_batch(jlist):
+            if dist in ['norm', 'splitnorm']:
+                arr = rand_mc(jlist)
+            else:
+                arr = np.broadcast_to(self.images, (len(jlist),)+self.images.shape)
+            ims = self.astype(self.func_image((arr, wcs_in), wcs_out,
+                                              shape_out=(len(jlist),)+im0.shape,
+                                              serial=(Nworkers>1)))
+            for j, im in zip(jlist, ims):
+                if filOUT is not None and mcmod==0:
+                    IO.write_fits(filOUT+'_'+str(j), refheader, im, self.wave, wmod=0,
+                               COMMENT="Reprojected by <imontage>. ")
+            return ims
+
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
+        ## Streaming std (Welford), realisations kept only for mcmod=1
+        count = mean = M2 = None
+        hyperim = np.empty((Nmc*(mcmod==1),)+im0.shape,
+                           dtype=ftype(im0)) # [j,(w,)y,x]
+        with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+            if share_map:
+                batches = [range(j, min(j+Nbatch, Nmc+1))
+                           for j in range(1, Nmc+1, Nbatch)]
+                results = (im for ims in bounded_map(executor, realise_batch,
+                                                     batches, Nworkers)
+                           for im in ims)
+            else:
+                results = bounded_map(executor, realise, range(1,Nmc+1), Nworkers)
+            for j, im in enumerate(tqdm(results,
+                                        total=Nmc, leave=False,
+                                        desc='<imontage> Reprojection [MC]')):
+                count, mean, M2 = welford(im, count, mean, M2)
+                if mcmod==1:
+                    hyperim[j] = im
+        if Nmc>0:
+            unc = welford_std(count, M2, dtype=ftype(im0))
+        else:
+            unc = np.full(im0.shape, np.nan)
         comment = "Reprojected by <imontage>. "
 
-        if Nmc>0:
+        if Nmc>0 and filOUT is not None:
             IO.write_fits(filOUT+'_unc', refheader, unc, self.wave,
                        COMMENT=comment)
+            if mcmod==1:
+                IO.write_fits(filOUT+'_mc', refheader, hyperim, self.wave,
+                           COMMENT=comment)
 
         ds.data = im0
         ds.unc = unc
@@ -425,76 +669,157 @@ class imontage(improve):
         return ds
 
     def coadd(self, flist, refheader, filOUT=None,
-              dist=None, acc_ptg=0, fill_ptg='near', Nmc=0):
+              dist=None, acc_ptg=0, fill_ptg='near', Nmc=0,
+              seed=None, Nworkers=None, mcmod=0, Nbatch=8):
         '''
         Reproject and coadd
+
+        mcmod               MC realisation outputs (Default: 0)
+                              0 - one file per realisation (filOUT_j)
+                              1 - all in one file (filOUT_mc, axis 0: j)
+
+        Each input file is read once (in threads); MC realisations
+        perturb in-memory copies and are coadded in threads
+        (seed - seed of the MC streams; Nworkers - number of threads;
+         Nbatch - max realisations per batch of shared pixel mapping)
+        Tasks are submitted through a window of Nworkers (bounded_map):
+        at most about Nworkers*Nbatch realisations are in memory
         '''
         flist = LA.listize(flist)
         ds = type('', (), {})()
         comment = "Created by <imontage>"
 
-        slist = [] # slist[j,if,iw]
-        for j in trange(Nmc+1, leave=False,
-                        desc='<imontage> Slicing... [MC]'):
-            sl = [] # sl[f,w]
-            for f in flist:
-                super().__init__(f)
-
-                ## Set tmp and out
-                filename = os.path.basename(f)
-                if filOUT is None:
-                    filOUT = self.path_tmp+filename+'_rep'
-                        
-                coadd_tmp = self.path_tmp+filename+'/'
-                if not os.path.exists(coadd_tmp):
-                    os.makedirs(coadd_tmp)
-                        
-                if j==0:
-                    sl.append(self.slice(coadd_tmp+'slice', ext=fitsext))
-                else:
-                    if dist=='norm':
-                        self.rand_norm(f+'_unc')
-                    elif dist=='splitnorm':
-                        self.rand_splitnorm([f+'_unc_N', f+'_unc_P'])
-                    self.rand_pointing(acc_ptg, fill=fill_ptg)
-                        
-                    sl.append(self.slice(coadd_tmp+'slice',
-                                         postfix='_'+str(j), ext=fitsext))
-            slist.append(np.array(sl))
-        slist = np.array(slist)
-        
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
+
+        ## Read inputs once (in threads)
+        ##-------------------------------
+        def read_base(f):
+            base = copy.copy(self)
+            improve.__init__(base, f)
+            if dist=='splitnorm':
+                base.reinit(filUNC=[f+'_unc_N'+fitsext, f+'_unc_P'+fitsext])
+            base.astype()
+            return base
+
+        with ThreadPoolExecutor(max_workers=min(Nworkers, len(flist))) as executor:
+            bases = list(executor.map(read_base, flist))
+        wcs2D = [IO.patch_wcs_3D(header=base.header).wcs for base in bases]
+        self.keep_input(bases[-1])
         Nw = self.Nw
-        superim = []
-        for j in trange(Nmc+1, leave=False,
-                        desc='<imontage> Coadding... [MC]'):
-            if j==0:
-                im = []
-                if self.Ndim==3:
-                    for iw in range(Nw):
-                        im.append(reproject_and_coadd(slist[j,:,iw], refheader,
-                                                      reproject_function=self.func)[0])
-                elif self.Ndim==2:
-                    im = reproject_and_coadd(slist[j,:,0], refheader,
-                                             reproject_function=self.func)[0]
-                im = np.array(im)
-
-                IO.write_fits(filOUT, refheader, im, self.wave, wmod=0,
-                           COMMENT=comment)
-            else:
-                hyperim = []
-                for iw in range(Nw):
-                    hyperim.append(reproject_and_coadd(slist[j,:,iw], refheader,
-                                                       reproject_function=self.func)[0])
-                superim.append(np.array(hyperim))
+        Ndim = self.Ndim
+
+        def coadd_images(imlist, Nj=None, serial=False):
+            ## imlist[if] -> coadded image/cube
+            ## (Nj - number of realisations stacked along axis 0;
+            ##  serial - see func_kwargs)
+            func_kw = self.func_kwargs(serial)
+            if Ndim==3:
+                ## Whole cubes reprojected at once (celestial WCS
+                ## broadcast along wavelength, reproject v0.11 or later),
+                ## then footprint-weighted mean as reproject_and_coadd
+                num = 0.
+                den = 0.
+                for i in range(len(flist)):
+                    if Nj is None:
+                        arr, fp = self.func((imlist[i], wcs2D[i]), refheader,
+                                            **func_kw)
+                    else:
+                        arr, fp = self.func((imlist[i], wcs2D[i]), wcs_out,
+                                            shape_out=(Nj,)+im.shape,
+                                            **func_kw)
+                    valid = ~np.isnan(arr)
+                    fp = np.where(valid, fp, 0.)
+                    num = num + np.where(valid, arr, 0.) * fp
+                    den = den + fp
+                im_co = np.where(den>0, num/np.where(den>0, den, 1.), 0.)
+            elif Ndim==2:
+                im_co = reproject_and_coadd(
+                    [(np.squeeze(imlist[i]), wcs2D[i]) for i in range(len(flist))],
+                    refheader, reproject_function=self.func,
+                    **func_kw)[0]
+            return self.astype(np.array(im_co))
+
+        im = coadd_images([base.images for base in bases])
+
+        if filOUT is not None:
+            IO.write_fits(filOUT, refheader, im, self.wave, wmod=0,
+                       COMMENT=comment)
 
+        ## MC realisations (independent, coadded in threads)
+        ##------------------------------------------------------
+        seeds = np.random.SeedSequence(seed).spawn(Nmc)
+        def perturb(j):
+            ## Realisation j of all input files
+            imlist = []
+            for base, sd in zip(bases, seeds[j-1].spawn(len(flist))):
+                rep = copy.copy(base)
+                rep.rng = np.random.default_rng(sd)
+                rep.images = np.array(base.images, dtype=ftype(base.images))
+                if dist=='norm':
+                    rep.rand_norm()
+                elif dist=='splitnorm':
+                    rep.rand_splitnorm()
+                if acc_ptg>0:
+                    rep.rand_pointing(acc_ptg, filltype=fill_ptg)
+                imlist.append(rep.images)
+            return imlist
+        
+        def coadd_mc(j):
+            hyperim = coadd_images(perturb(j), serial=(Nworkers>1))
+            
+            if filOUT is not None and mcmod==0:
                 IO.write_fits(filOUT+'_'+str(j), refheader, hyperim, self.wave, wmod=0,
                            COMMENT=comment)
-        superim = np.array(superim)
-        unc = np.nanstd(superim, axis=0)
-
+            return hyperim
+
+        ## Without pointing errors, the pixel mapping of each input
+        ## cube is the same for all realisations: computed once per
+        ## batch of realisations (celestial WCS broadcast along j and w)
+        share_map = (acc_ptg==0 and Ndim==3)
+        if share_map:
+            wcs_out = IO.patch_wcs_3D(header=refheader).wcs
+        def coadd_mc_batch(jlist):
+            imlists = [perturb(j) for j in jlist]
+            hyperims = coadd_images([np.stack([imlist[i] for imlist in imlists])
+                                     for i in range(len(flist))], Nj=len(jlist),
+                                    serial=(Nworkers>1))
+            for j, hyperim in zip(jlist, hyperims):
+                if filOUT is not None and mcmod==0:
+                    IO.write_fits(filOUT+'_'+str(j), refheader, hyperim, self.wave, wmod=0,
+                               COMMENT=comment)
+            return hyperims
+
+        ## Streaming std (Welford), realisations kept only for mcmod=1
+        count = mean = M2 = None
+        superim = np.empty((Nmc*(mcmod==1),)+im.shape,
+                           dtype=ftype(im)) # [j,(w,)y,x]
+        with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+            if share_map:
+                batches = [range(j, min(j+Nbatch, Nmc+1))
+                           for j in range(1, Nmc+1, Nbatch)]
+                results = (hyperim for hyperims in bounded_map(executor, coadd_mc_batch,
+                                                               batches, Nworkers)
+                           for hyperim in hyperims)
+            else:
+                results = bounded_map(executor, coadd_mc, range(1,Nmc+1), Nworkers)
+            for j, hyperim in enumerate(tqdm(results,
+                                             total=Nmc, leave=False,
+                                             desc='<imontage> Coadding... [MC]')):
+                count, mean, M2 = welford(hyperim, count, mean, M2)
+                if mcmod==1:
+                    superim[j] = hyperim
         if Nmc>0:
+            unc = welford_std(count, M2, dtype=ftype(im))
+        else:
+            unc = np.full(im.shape, np.nan)
+
+        if Nmc>0 and filOUT is not None:
             IO.write_fits(filOUT+'_unc', refheader, unc, self.wave, wmod=0,
                        COMMENT=comment)
+            if mcmod==1:
+                IO.write_fits(filOUT+'_mc', refheader, superim, self.wave, wmod=0,
+                           COMMENT=comment)
 
         ds.wave = self.wave
         ds.data = im
@@ -505,9 +830,9 @@ class imontage(improve):
 
     def clean(self, filIN=None):
         if filIN is not None:
-            fclean(filIN)
+            UT.fclean(filIN)
         else:
-            fclean(self.path_tmp)
+            UT.fclean(self.path_tmp)
 
 class iswarp(improve):
     '''
@@ -525,7 +850,11 @@ class iswarp(improve):
                           None - median of pixscale at center input frames
                           float() - in arcseconds
     verbose             default: True
-    tmpdir              tmp file path
+    tmpdir              tmp file path (Default: None - UT.localbuff)
+    shm                 default tmp files in RAM (/dev/shm, see UT.localbuff)
+                          (Default: False - cwd/tmp_swp/)
+    Nworkers            number of threads preparing the reference frames
+                          (Default: None - half of CPUs)
     ------ OUTPUT ------
     coadd.fits
     
@@ -536,7 +865,7 @@ class iswarp(improve):
     '''
     def __init__(self, flist=None, refheader=None,
                  center=None, pixscale=None, 
-                 verbose=False, tmpdir=None):
+                 verbose=False, tmpdir=None, shm=False, Nworkers=None):
         '''
         self: path_tmp, verbose
         (filIN, wmod, hdr, w, Ndim, Nx, Ny, Nw, im, wvl)
@@ -550,15 +879,14 @@ class iswarp(improve):
         
         ## Set path of tmp files
         if tmpdir is None:
-            path_tmp = os.getcwd()+'/tmp_swp/'
+            path_tmp = UT.localbuff('tmp_swp', shm=shm)
         else:
             path_tmp = tmpdir
-        if not os.path.exists(path_tmp):
-            os.makedirs(path_tmp)
+        os.makedirs(path_tmp, exist_ok=True)
         
         self.path_tmp = path_tmp
 
-        fclean(path_tmp+'coadd*') # remove previous coadd.fits/.head
+        UT.fclean(path_tmp+'coadd*') # remove previous coadd.fits/.head
 
         if flist is None:
             if refheader is None:
@@ -575,19 +903,26 @@ class iswarp(improve):
             flist = LA.listize(flist)
                 
             ## Images
-            image_files = ' '
-            list_ref = []
-            for i in range(len(flist)):
-                image = IO.read_fits(flist[i]).data
-                hdr = fixwcs(flist[i]+fitsext).header
-                file_ref = flist[i]
-                if image.ndim==3:
-                    ## Extract 1st frame of the cube
-                    file_ref = path_tmp+os.path.basename(flist[i])+'_ref'
-                    IO.write_fits(file_ref, hdr, image[0])
-                
-                image_files += file_ref+fitsext+' ' # SWarp input str
-                list_ref.append(file_ref+fitsext) # reproject input
+            def extract_ref(fname):
+                ## Header first: only the 1st frame is read for cubes
+                with fits.open(fname+fitsext, memmap=True) as hdul:
+                    hdu = hdul[0] if hdul[0].header['NAXIS']>0 else hdul[1]
+                    if hdu.header['NAXIS']!=3:
+                        return fname
+                    hdr = IO.patch_wcs_3D(header=hdu.header).header
+                    image = hdu.section[0]
+                ## Extract 1st frame of the cube
+                file_ref = path_tmp+os.path.basename(fname)+'_ref'
+                IO.write_fits(file_ref, hdr, image)
+                return file_ref
+            
+            ## Independent files prepared in parallel (I/O bound)
+            if Nworkers is None:
+                Nworkers = max(os.cpu_count()//2, 1)
+            with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+                list_ref = [file_ref+fitsext # reproject input
+                            for file_ref in executor.map(extract_ref, flist)]
+            image_files = ' '+''.join([f+' ' for f in list_ref]) # SWarp input str
 
             ## Define coadd frame
             ##--------------------
@@ -619,13 +954,12 @@ class iswarp(improve):
                     warnings.warn('The keywords center and pixscale are dumb. ')
 
                 super().__init__(path_tmp+'coadd.ref')
-                pix_old = [[0, 0]]
-                pix_old.append([0, self.Ny])
-                pix_old.append([self.Nx, 0])
-                pix_old.append([self.Nx, self.Ny])
-                world_arr = self.w.all_pix2world(np.array(pix_old), 1)
+                ## All 4 corners transformed in one call each way
+                pix_old = np.array([[0, 0], [0, self.Ny],
+                                    [self.Nx, 0], [self.Nx, self.Ny]])
+                world_arr = self.wcs.all_pix2world(pix_old, 1)
                 
-                w = fixwcs(header=refheader).wcs
+                w = IO.patch_wcs_3D(header=refheader).wcs
                 try:
                     pix_new = w.all_world2pix(world_arr, 1)
                 except wcs.wcs.NoConvergence as e:
@@ -633,10 +967,8 @@ class iswarp(improve):
                     print("Best solution:\n{0}".format(e.best_solution))
                     print("Achieved accuracy:\n{0}".format(e.accuracy))
                     print("Number of iterations:\n{0}".format(e.niter))
-                xmin = min(pix_new[:,0])
-                xmax = max(pix_new[:,0])
-                ymin = min(pix_new[:,1])
-                ymax = max(pix_new[:,1])
+                xmin, ymin = pix_new.min(axis=0)
+                xmax, ymax = pix_new.max(axis=0)
 
                 refheader['CRPIX1'] += -xmin
                 refheader['CRPIX2'] += -ymin
@@ -664,7 +996,8 @@ class iswarp(improve):
         return im_fp
 
     def combine(self, flist, combtype='med', keepedge=False, cropedge=False,
-                dist=None, acc_ptg=0, fill_ptg='near', filOUT=None, tmpdir=None):
+                dist=None, acc_ptg=0, fill_ptg='near', filOUT=None, tmpdir=None,
+                Nworkers=None, Nthreads=None, backend='swarp'):
         '''
         SWarp combine (coadding/reprojection)
 
@@ -684,6 +1017,14 @@ class iswarp(improve):
                               'near': nearest non-NaN value on the same axis (default)
                               float: constant
         filOUT              output FITS file
+        Nworkers            number of parallel SWarp runs
+                              (Default: None - half of CPUs)
+        Nthreads            threads shared by the parallel SWarp runs
+                              (Default: None - all CPUs)
+        backend             resampling engine
+                              'swarp' - SWarp on sliced files (default)
+                              'python' - in-memory reproject_interp
+                                         (no slice files, keepedge ignored)
         ------ OUTPUT ------
         coadd.head          key for SWarp (inherit self.refheader)
         '''
@@ -697,8 +1038,7 @@ class iswarp(improve):
             path_comb = path_tmp+'comb/'
         else:
             path_comb = tmpdir
-        if not os.path.exists(path_comb):
-            os.makedirs(path_comb)
+        os.makedirs(path_comb, exist_ok=True)
 
         ## Input files in list format
         flist = LA.listize(flist)
@@ -712,10 +1052,11 @@ class iswarp(improve):
         ##--------------------
         Nf = len(flist)
         
-        imshape = IO.read_fits(flist[0]).data.shape
+        ds0 = IO.read_fits(flist[0])
+        imshape = ds0.data.shape
         if len(imshape)==3:
             Nw = imshape[0]
-            wvl = IO.read_fits(flist[0]).wave
+            wvl = ds0.wave
         else:
             Nw = 1
             wvl = None
@@ -730,37 +1071,42 @@ class iswarp(improve):
             
             ## Slice
             super().__init__(flist[i])
+            ## Celestial WCS parsed once per file (reused for the weights)
+            if backend=='python':
+                w_i = IO.patch_wcs_3D(header=self.header).wcs
+            ## Pixel FoV of the last input frame (see flux-rescaling below)
+            ## (cached by header string, the same for all combine_mc calls)
+            if i==Nf-1:
+                old_pixel_fov = _pixel_fov(self.header.tostring())
             if dist=='norm':
-                self.rand_norm(flist[i]+'_unc')
+                self.rand_norm()
             elif dist=='splitnorm':
-                self.rand_splitnorm([flist[i]+'_unc_N', flist[i]+'_unc_P'])
-            self.rand_pointing(acc_ptg, fill=fill_ptg)
-            imlist.append(self.slice(file_slice, ''))
+                self.reinit(filUNC=[flist[i]+'_unc_N'+fitsext, flist[i]+'_unc_P'+fitsext])
+                self.rand_splitnorm()
+            if acc_ptg>0:
+                self.rand_pointing(acc_ptg, filltype=fill_ptg)
+            if backend=='python':
+                ## Kept in memory with its celestial WCS
+                imlist.append((self.images, w_i))
+            else:
+                imlist.append(self.slice(file_slice, ''))
             
             if combtype=='wgt_avg':
                 super().__init__(flist[i]+'_unc')
-                wgtlist.append(self.slice_inv_sq(file_slice, '.weight'))
-
-        ## Build image_files & weight_files (size=Nw)
-        image_files = [' ']*Nw
-        weight_files = [' ']*Nw
-
-        ## Let's SWarp
-        ##-------------
-        hyperimage = []
-        for k in trange(Nw, leave=False, 
-            desc='<iswarp> Combining (by wvl)'):
-            for i in range(Nf):
-                image_files[k] += imlist[i][k]+fitsext+' '
+                if backend=='python':
+                    wgtlist.append((np.reciprocal(np.square(self.images)), w_i))
+                else:
+                    wgtlist.append(self.slice_inv_sq(file_slice, '.weight'))
 
-                if combtype=='wgt_avg':
-                    weight_files[k] += wgtlist[i][k]+fitsext+' '
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
 
-            ## Create config file
+        if backend=='swarp':
+            ## SWarp config (same for all wavelengths)
             SP.call('swarp -d > swarp.cfg',
                     shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-            ## Config param list
-            swarp_opt = ' -c swarp.cfg -SUBTRACT_BACK N '
+            ## Config param list (absolute path, read in place by every run)
+            swarp_opt = ' -c '+os.path.abspath(path_tmp+'swarp.cfg')+' -SUBTRACT_BACK N '
             if combtype=='med':
                 pass
             elif combtype=='avg':
@@ -769,92 +1115,142 @@ class iswarp(improve):
                 swarp_opt += ' -COMBINE_TYPE WEIGHTED '
                 swarp_opt += ' -WEIGHT_TYPE MAP_WEIGHT '
                 swarp_opt += ' -WEIGHT_SUFFIX .weight.fits '
-                # swarp_opt += ' -WEIGHT_IMAGE '+weight_files[k] # not worked
+                # swarp_opt += ' -WEIGHT_IMAGE '+weight_files # not worked
             if verbose=='quiet':
                 swarp_opt += ' -VERBOSE_TYPE QUIET '
-            ## Run SWarp
-            SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE LANCZOS3 '+image_files[k],
-                    shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-            coadd = IO.read_fits(path_tmp+'coadd')
-            newimage = coadd.data
-            newheader = coadd.header
-
-            ## Add back in the edges because LANCZOS3 kills the edges
-            ## Do it in steps of less and less precision
-            if keepedge==True:
-                oldweight = IO.read_fits(path_tmp+'coadd.weight').data
-                if np.sum(oldweight==0)!=0:
-                    SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE LANCZOS2 '+image_files[k],
-                        shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-                    edgeimage = IO.read_fits(path_tmp+'coadd').data
-                    newweight = IO.read_fits(path_tmp+'coadd.weight').data
-                    edgeidx = np.logical_and(oldweight==0, newweight!=0)
-                    if edgeidx.any():
-                        newimage[edgeidx] = edgeimage[edgeidx]
-
-                    oldweight = IO.read_fits(path_tmp+'coadd.weight').data
-                    if np.sum(oldweight==0)!=0:
-                        SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE BILINEAR '+image_files[k],
-                            shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-                        edgeimage = IO.read_fits(path_tmp+'coadd').data
-                        newweight = IO.read_fits(path_tmp+'coadd.weight').data
-                        edgeidx = np.logical_and(oldweight==0, newweight!=0)
+            ## Parallel runs share the cores (no oversubscription)
+            if Nthreads is None:
+                Nthreads = os.cpu_count()
+            Nworkers = min(Nworkers, Nw)
+            swarp_opt += ' -NTHREADS '+str(max(Nthreads//Nworkers, 1))+' '
+
+            def swarp_slice(k):
+                ## Each wavelength runs in its own dir (coadd.fits not shared)
+                path_k = path_tmp+'swp_'+str(k)+'/'
+                os.makedirs(path_k, exist_ok=True)
+                shutil.copy(path_tmp+'coadd.head', path_k)
+            
+                ## File lists of slice k (nested list, built at call time)
+                image_files = ' '+''.join([os.path.abspath(imlist[i][k]+fitsext)+' '
+                                           for i in range(Nf)])
+                ## Run SWarp
+                SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE LANCZOS3 '+image_files,
+                        shell=True, cwd=path_k, stdout=devnull, stderr=SP.STDOUT)
+                ## Data-only reads (no format identification as read_fits)
+                newimage = IO.read_fits_data(path_k+'coadd')
+                newheader = fits.getheader(path_k+'coadd'+fitsext)
+
+                ## Add back in the edges because LANCZOS3 kills the edges
+                ## Do it in steps of less and less precision
+                ## (stop as soon as no zero weight is left,
+                ##  np.all short-circuits at the first zero)
+                if keepedge==True:
+                    oldweight = IO.read_fits_data(path_k+'coadd.weight')
+                    for resampling in ['LANCZOS2', 'BILINEAR', 'NEAREST']:
+                        if np.all(oldweight):
+                            break
+                        SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE '+resampling+image_files,
+                                shell=True, cwd=path_k, stdout=devnull, stderr=SP.STDOUT)
+                        edgeimage = IO.read_fits_data(path_k+'coadd') # edges only
+                        newweight = IO.read_fits_data(path_k+'coadd.weight')
+                        ## old zero & new non-zero weight
+                        edgeidx = np.logical_and(np.logical_not(oldweight), newweight)
                         if edgeidx.any():
-                            newimage[edgeidx] = edgeimage[edgeidx]
-
-                        oldweight = IO.read_fits(path_tmp+'coadd.weight').data
-                        if np.sum(oldweight==0)!=0:
-                            SP.call('swarp '+swarp_opt+' -RESAMPLING_TYPE NEAREST '+image_files[k],
-                                shell=True, cwd=path_tmp, stdout=devnull, stderr=SP.STDOUT)
-                            edgeimage = IO.read_fits(path_tmp+'coadd').data
-                            newweight = IO.read_fits(path_tmp+'coadd.weight').data
-                            edgeidx = np.logical_and(oldweight==0, newweight!=0)
-                            if edgeidx.any():
-                                newimage[edgeidx] = edgeimage[edgeidx]
+                            np.copyto(newimage, edgeimage, where=edgeidx)
+                        oldweight = newweight # same coadd.weight, not re-read
+
+                UT.fclean(path_k)
             
-            ## Astrometric flux-rescaling based on the local ratio of pixel scale
-            ## Complementary for lack of FITS kw 'FLXSCALE'
-            ## Because SWarp is conserving surface brightness/pixel
-            oldcdelt = get_pc(wcs=fixwcs(flist[i]+fitsext).wcs).cdelt
-            newcdelt = get_pc(wcs=fixwcs(path_tmp+'coadd'+fitsext).wcs).cdelt
-            old_pixel_fov = abs(oldcdelt[0]*oldcdelt[1])
-            new_pixel_fov = abs(newcdelt[0]*newcdelt[1])
-            newimage = newimage * old_pixel_fov/new_pixel_fov
-            newimage[newimage==0] = np.nan
-            # IO.write_fits(path_comb+'coadd_'+str(k), newheader, newimage)
-            # tqdm.write(str(old_pixel_fov))
-            # tqdm.write(str(new_pixel_fov))
-            # tqdm.write(str(abs(newheader['CD1_1']*newheader['CD2_2'])))
-
-            if Nw==1:
-                hyperimage = newimage
+                return newimage, newheader
+
+            ## Let's SWarp (wavelengths in parallel)
+            ##-------------
+            with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+                for k, (newimage, newheader) in enumerate(tqdm(
+                    executor.map(swarp_slice, range(Nw)), total=Nw, leave=False,
+                    desc='<iswarp> Combining (by wvl)')):
+                
+                    ## Astrometric flux-rescaling based on the local ratio of pixel scale
+                    ## Complementary for lack of FITS kw 'FLXSCALE'
+                    ## Because SWarp is conserving surface brightness/pixel
+                    ## (same frames at all wavelengths: WCS parsed once)
+                    if k==0:
+                        newcdelt = IO.get_pc(header=newheader).cdelt
+                        new_pixel_fov = abs(newcdelt[0]*newcdelt[1])
+                    # IO.write_fits(path_comb+'coadd_'+str(k), newheader, newimage)
+                    # tqdm.write(str(old_pixel_fov))
+                    # tqdm.write(str(new_pixel_fov))
+                    # tqdm.write(str(abs(newheader['CD1_1']*newheader['CD2_2'])))
+
+                    ## Output cube allocated once the SWarp frame is known
+                    ## (rescaled slice written in place, no temporary)
+                    if k==0:
+                        hyperimage = np.empty((Nw,)+newimage.shape, dtype=ftype(newimage))
+                    np.multiply(newimage, old_pixel_fov/new_pixel_fov, out=hyperimage[k])
+                    np.copyto(hyperimage[k], np.nan, where=(hyperimage[k]==0))
+
+        elif backend=='python':
+            ## In-memory reprojection (whole cubes at once,
+            ## celestial WCS broadcast along wavelength)
+            newheader = self.refheader
+            wcs_out = IO.patch_wcs_3D(header=newheader).wcs
+            shape_out = (newheader['NAXIS2'], newheader['NAXIS1'])
+            if len(imshape)==3:
+                shape_out = (Nw,)+shape_out
+            
+            ## Working dtype of the inputs (float32 for BITPIX=-32 as SWarp)
+            dtype = ftype(imlist[0][0])
+            
+            def reproject_file(i):
+                arr, fp = reproject_interp(imlist[i], wcs_out, shape_out=shape_out)
+                fp[np.isnan(arr)] = 0
+                if combtype=='wgt_avg':
+                    wgt = reproject_interp(wgtlist[i], wcs_out, shape_out=shape_out)[0]
+                    fp *= np.nan_to_num(wgt)
+                return arr.astype(dtype, copy=False), fp.astype(dtype, copy=False)
+
+            with ThreadPoolExecutor(max_workers=min(Nworkers, Nf)) as executor:
+                reps = list(executor.map(reproject_file, range(Nf)))
+            arrs = np.stack([arr for arr, fp in reps])
+            fps = np.stack([fp for arr, fp in reps])
+            del reps
+            
+            if combtype=='med':
+                arrs[fps==0] = np.nan
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning) # no coverage
+                    hyperimage = np.nanmedian(arrs, axis=0)
             else:
-                hyperimage.append(newimage)
+                ## (weighted) average, weights being the footprints
+                arrs[fps==0] = 0
+                den = np.sum(fps, axis=0)
+                hyperimage = np.sum(arrs*fps, axis=0) / np.where(den>0, den, 1.)
+            
+            ## Astrometric flux-rescaling (same as SWarp)
+            newcdelt = IO.get_pc(wcs=wcs_out).cdelt
+            new_pixel_fov = abs(newcdelt[0]*newcdelt[1])
+            hyperimage *= old_pixel_fov/new_pixel_fov
+            np.copyto(hyperimage, np.nan, where=(hyperimage==0))
+            if len(imshape)==2:
+                hyperimage = hyperimage[np.newaxis]
+        else:
+            raise ValueError('Unknown backend! ')
 
-        hyperimage = np.array(hyperimage)
+        if Nw==1:
+            hyperimage = hyperimage[0]
 
         if cropedge:
             reframe = improve(header=newheader, images=hyperimage, wave=wvl)
-            xlist = []
-            for x in range(reframe.Nx):
-                if reframe.Ndim==3:
-                    allnan = np.isnan(reframe.im[:,:,x]).all()
-                elif reframe.Ndim==2:
-                    allnan = np.isnan(reframe.im[:,x]).all()
-                if not allnan:
-                    xlist.append(x)
-            ylist = []
-            for y in range(reframe.Ny):
-                if reframe.Ndim==3:
-                    allnan = np.isnan(reframe.im[:,y,:]).all()
-                elif reframe.Ndim==2:
-                    allnan = np.isnan(reframe.im[y,:]).all()
-                if not allnan:
-                    ylist.append(y)
-            xmin = min(xlist)
-            xmax = max(xlist)+1
-            ymin = min(ylist)
-            ymax = max(ylist)+1
+            ## Columns/rows with data (one reduction over the cube)
+            valid = ~np.isnan(reframe.images)
+            if reframe.Ndim==3:
+                valid = valid.any(axis=0)
+            xvalid = valid.any(axis=0)
+            yvalid = valid.any(axis=1)
+            xmin = np.argmax(xvalid)
+            xmax = reframe.Nx - np.argmax(xvalid[::-1])
+            ymin = np.argmax(yvalid)
+            ymax = reframe.Ny - np.argmax(yvalid[::-1])
             dx = xmax-xmin
             dy = ymax-ymin
             x0 = xmin+dx/2
@@ -862,8 +1258,8 @@ class iswarp(improve):
 
             reframe.crop(filOUT=path_tmp+'coadd.ref',
                          sizpix=(dx,dy), cenpix=(x0,y0))
-            newheader = reframe.hdr
-            hyperimage = reframe.im
+            newheader = reframe.header
+            hyperimage = reframe.images
             cropcenter = (x0,y0)
             cropsize = (dx,dy)
         else:
@@ -875,7 +1271,7 @@ class iswarp(improve):
                        wave=wvl, wmod=self.wmod, filext=self.filext)
 
         if tmpdir is None:
-            fclean(path_comb)
+            UT.fclean(path_comb)
 
         ds.header = newheader
         ds.data = hyperimage
@@ -888,33 +1284,80 @@ class iswarp(improve):
     def combine_mc(self, filIN, Nmc=0,
                    combtype='med', keepedge=False, cropedge=False,
                    dist=None, acc_ptg=0, fill_ptg='near',
-                   filOUT=None, tmpdir=None):
+                   filOUT=None, tmpdir=None, mcmod=0,
+                   Nworkers=None, backend='swarp'):
         '''
         Generate Monte-Carlo uncertainties for reprojected input file
+
+        mcmod               MC realisation outputs (Default: 0)
+                              0 - one file per realisation (filOUT_j)
+                              1 - all in one file (filOUT_mc, axis 0: j)
+
+        MC realisations are independent: each one runs in a thread
+        on its own copy of self, with its own tmp dirs
+        (Nworkers - number of threads, sharing the CPUs with the
+         wavelength-parallel SWarp runs of each combine:
+         each realisation gets CPUs/Nworkers SWarp threads)
         '''
         ds = type('', (), {})()
 
-        hyperim = [] # [j,(w,)y,x]
-        for j in trange(Nmc+1, leave=False,
-                        desc='<iswarp> Reprojection (MC level)'):
-
-            if j==0:
-                comb = self.combine(filIN, filOUT=filOUT, tmpdir=tmpdir,
-                                    combtype=combtype, keepedge=keepedge, cropedge=cropedge)
-                im0 = comb.data
+        comb = self.combine(filIN, filOUT=filOUT, tmpdir=tmpdir,
+                            combtype=combtype, keepedge=keepedge, cropedge=cropedge,
+                            backend=backend)
+        im0 = np.asarray(comb.data)
+
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
+        Nworkers = max(min(Nworkers, Nmc), 1)
+        ## Thread budget of each realisation passed down to combine
+        Nthreads_comb = max(os.cpu_count()//Nworkers, 1)
+        Nworkers_comb = max(os.cpu_count()//2//Nworkers, 1)
+        
+        def realise(j):
+            rep = copy.copy(self)
+            rep.path_tmp = self.path_tmp+'mc_'+str(j)+'/'
+            os.makedirs(rep.path_tmp, exist_ok=True)
+            if tmpdir is None:
+                tmpdir_j = None
+            else:
+                tmpdir_j = tmpdir+'mc_'+str(j)+'/'
+            if mcmod==0:
+                filMC = filOUT+'_'+str(j)
             else:
-                hyperim.append( self.combine(filIN, filOUT=filOUT+'_'+str(j),
-                                             tmpdir=tmpdir, combtype=combtype,
-                                             keepedge=keepedge, cropedge=cropedge,
-                                             dist=dist, acc_ptg=acc_ptg, fill_ptg=fill_ptg).data )
-        im0 = np.array(im0)
-        hyperim = np.array(hyperim)
-        unc = np.nanstd(hyperim, axis=0)
+                filMC = None
+            im = rep.combine(filIN, filOUT=filMC,
+                             tmpdir=tmpdir_j, combtype=combtype,
+                             keepedge=keepedge, cropedge=cropedge,
+                             dist=dist, acc_ptg=acc_ptg, fill_ptg=fill_ptg,
+                             Nworkers=Nworkers_comb, Nthreads=Nthreads_comb,
+                             backend=backend).data
+            UT.fclean(rep.path_tmp)
+            return im
+
+        ## Streaming std (Welford), realisations kept only for mcmod=1
+        count = mean = M2 = None
+        hyperim = np.empty((Nmc*(mcmod==1),)+im0.shape,
+                           dtype=ftype(im0)) # [j,(w,)y,x]
+        with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+            for j, im in enumerate(tqdm(bounded_map(executor, realise,
+                                                    range(1,Nmc+1), Nworkers),
+                                        total=Nmc, leave=False,
+                                        desc='<iswarp> Reprojection (MC level)')):
+                count, mean, M2 = welford(im, count, mean, M2)
+                if mcmod==1:
+                    hyperim[j] = im
+        if Nmc>0:
+            unc = welford_std(count, M2, dtype=ftype(im0))
+        else:
+            unc = np.full(im0.shape, np.nan)
         comment = "Created by <iswarp>"
 
         if Nmc>0:
             IO.write_fits(filOUT+'_unc', comb.header, unc, comb.wave,
                        COMMENT=comment)
+            if mcmod==1:
+                IO.write_fits(filOUT+'_mc', comb.header, hyperim, comb.wave,
+                           COMMENT=comment)
 
         ds.data = im0
         ds.unc = unc
@@ -924,9 +1367,9 @@ class iswarp(improve):
     
     def clean(self, filIN=None):
         if filIN is not None:
-            fclean(filIN)
+            UT.fclean(filIN)
         else:
-            fclean(self.path_tmp)
+            UT.fclean(self.path_tmp)
 
 class iconvolve(improve):
     '''
@@ -966,10 +1409,12 @@ class iconvolve(improve):
                          instr=instr, instr_auto=instr_auto)
         
         if dist=='norm':
-            self.rand_norm(filIN+'_unc')
+            self.rand_norm()
         elif dist=='splitnorm':
-            self.rand_splitnorm(filIN+'_unc')
-        self.rand_pointing(acc_ptg, fill=fill_ptg)
+            self.reinit(filUNC=[filIN+'_unc_N'+fitsext, filIN+'_unc_P'+fitsext])
+            self.rand_splitnorm()
+        if acc_ptg>0:
+            self.rand_pointing(acc_ptg, filltype=fill_ptg)
 
         ## Input kernel file in list format
         self.kfile = LA.listize(kfile)
@@ -1008,9 +1453,8 @@ class iconvolve(improve):
         self.fwhm_lam = np.sqrt(fwhm_par * fwhm_per)
         
         ## sigma (arcsec)
-        sigma_par = fwhm_par / (2. * np.sqrt(2.*np.log(2.)))
-        sigma_per = fwhm_per / (2. * np.sqrt(2.*np.log(2.)))
-        self.sigma_lam = np.sqrt(sigma_par * sigma_per)
+        ## (geometric mean commutes with the constant FWHM-to-sigma factor)
+        self.sigma_lam = self.fwhm_lam / (2. * math.sqrt(2.*math.log(2.)))
 
     # def choker(self, flist):
     #     '''
@@ -1039,39 +1483,50 @@ class iconvolve(improve):
     #     ## write csv file
     #     IO.write_csv(self.klist, header=['Images', 'Kernels'], dset=lst)
 
-    def choker(self, flist):
+    def choker(self, flist, Nshard=1):
         '''
         ------ INPUT ------
         flist               FITS files to be convolved
+        Nshard              number of kernel lists (Default: 1)
+                              >1 - klist_<k>.csv, one per IDL run
         ------ OUTPUT ------
+        klists              kernel list files (full names)
         '''
         ## Input files in list format
         flist = LA.listize(flist)
         
         ## CHOose KERnel(s)
-        images = []
-        kernels = []
-        for i, filim in enumerate(flist):
-            ## check PSF profil (or is not a cube)
-            if self.fwhm_lam is not None:
-                images.append(filim)
-                ind = LA.closest(self.psf, self.fwhm_lam[i])
-                # print('ind = ',ind)
-                # print('psf = ',self.psf[ind])
-                # print('kfile = ',self.kfile[ind])
-                kernels.append(self.kfile[ind])
-            else:
-                images.append(flist[0])
-                kernels.append(self.kfile[0])
+        ## check PSF profil (or is not a cube)
+        if self.fwhm_lam is not None:
+            images = list(flist)
+            ## closest PSF of all slices at once (first one if tied, as LA.closest)
+            dist = np.abs(np.asarray(self.psf, dtype=float)[np.newaxis,:] -
+                          np.asarray(self.fwhm_lam)[:len(flist),np.newaxis])
+            kernels = [self.kfile[ind] for ind in np.nanargmin(dist, axis=1)]
+        else:
+            images = [flist[0]] * len(flist)
+            kernels = [self.kfile[0]] * len(flist)
+
+        ## write csv file (C fast writer; CSV kept for the IDL side)
+        if Nshard==1:
+            klists = [self.klist+csvext]
+        else:
+            klists = [self.klist+'_'+str(k)+csvext for k in range(Nshard)]
+        for k, ind in enumerate(np.array_split(np.arange(len(images)), Nshard)):
+            dataset = Table([[images[i] for i in ind], [kernels[i] for i in ind]],
+                            names=['Images', 'Kernels'])
+            ascii.write(dataset, klists[k], format='csv',
+                        fast_writer='force', overwrite=True)
 
-        ## write csv file
-        dataset = Table([images, kernels], names=['Images', 'Kernels'])
-        ascii.write(dataset, self.klist+csvext, format='csv')
+        return klists
 
-    def do_conv(self, idldir, verbose=False):
+    def do_conv(self, idldir, verbose=False, Nworkers=1):
         '''
         ------ INPUT ------
         idldir              path of IDL routines
+        Nworkers            number of concurrent IDL runs (Default: 1)
+                              slices are split between the runs
+                              (each run takes an IDL licence)
         ------ OUTPUT ------
         '''
         if verbose==False:
@@ -1092,29 +1547,35 @@ class iconvolve(improve):
         elif self.Ndim==2:
             f2conv = [self.filIN]
         
-        self.choker(f2conv)
+        Nworkers = max(min(Nworkers, len(f2conv)), 1)
+        klists = self.choker(f2conv, Nshard=Nworkers)
 
-        SP.call('idl conv.pro',
-                shell=True, cwd=idldir, stdout=devnull, stderr=SP.STDOUT)
+        def run_idl(klist):
+            SP.call('idl conv.pro -args '+os.path.abspath(klist),
+                    shell=True, cwd=idldir, stdout=devnull, stderr=SP.STDOUT)
+
+        with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+            list(executor.map(run_idl, klists))
 
         ## OUTPUTS
         ##---------
         if self.Ndim==3:
-            im = []
-            self.slist = []
-            for f in f2conv:
-                im.append(IO.read_fits(f+'_conv').data)
-                self.slist.append(f+'_conv')
-
-            self.convim = np.array(im)
+            ## Slices read into a preallocated cube (data only)
+            self.slist = [f+'_conv' for f in f2conv]
+            im0 = IO.read_fits_data(self.slist[0])
+            self.convim = np.empty((len(f2conv),)+im0.shape, dtype=ftype(im0))
+            self.convim[0] = im0
+            for w, s in enumerate(self.slist[1:], start=1):
+                IO.read_fits_data(s, out=self.convim[w])
             ## recover 3D header cause the lost of WCS due to PS3_0='WCS-TAB'
             # self.header = IO.read_fits(self.filIN).header
 
-            fclean(f+'_conv'+fitsext)
+            for s in self.slist:
+                UT.fclean(s+fitsext)
         elif self.Ndim==2:
-            self.convim = IO.read_fits(self.filIN+'_conv').data
+            self.convim = IO.read_fits_data(self.filIN+'_conv')
 
-            fclean(self.filIN+'_conv'+fitsext)
+            UT.fclean(self.filIN+'_conv'+fitsext)
         
         if self.filOUT is not None:
             comment = "Convolved by G. Aniano's IDL routine."
@@ -1126,10 +1587,10 @@ class iconvolve(improve):
 
     def clean(self, filIN=None):
         if filIN is not None:
-            fclean(filIN)
+            UT.fclean(filIN)
         else:
             if self.path_conv is not None:
-                fclean(self.path_conv)
+                UT.fclean(self.path_conv)
 
 def wmask(filIN, filOUT=None):
     '''
@@ -1144,6 +1605,54 @@ def wmask(filIN, filOUT=None):
     '''
     pass
 
+def wclean_trim(ilist, icen, Nw_seg, cmod='eq'):
+    '''
+    Numbers of crossing wvl indices to keep (i.e. trim from the 
+    removal list) at both ends of a segment, see wclean
+
+    --- INPUT ---
+    ilist       index list of sorted wave segment
+    icen        index of wave segment center
+    Nw_seg      number of crossing wvl in segment
+    cmod        clean mode (Default: 'eq')
+    --- OUTPUT ---
+    front       number of indices trimmed at the beginning
+    back        number of indices trimmed at the end
+    '''
+    ilist = np.asarray(ilist)
+    front, back = 0, 0
+    ## Remove all crossing wvl between two channels
+    ##----------------------------------------------
+    if cmod=='all': # most conservative but risk having holes
+        pass
+    ## Remove (almost) equal wvl (NOT nb of wvl!) for both sides
+    ##-----------------------------------------------------------
+    elif cmod=='eq': # (default)
+        ## Select ascendant pair closest to segment center
+        if icen>0:
+            if ilist[icen]>ilist[0]: # large center
+                found = np.flatnonzero(ilist[icen:0:-1]<ilist[0])
+                if len(found)>0:
+                    front = ilist[icen-found[0]]+1
+                    back = Nw_seg-ilist[icen]
+            else: # small center
+                found = np.flatnonzero(ilist[icen:2*icen]>ilist[0])
+                if len(found)>0:
+                    front = ilist[icen]+1
+                    back = Nw_seg-ilist[icen+found[0]]
+    ## Leave 2 closest wvl not crossing
+    ##----------------------------------
+    elif cmod=='closest_left':
+        front = ilist[0]
+    elif cmod=='closest_right':
+        back = Nw_seg-ilist[0]
+    ## Others
+    ##--------
+    else:
+        raise ValueError('Non-supported clean mode! ')
+
+    return int(front), int(back)
+
 def wclean(filIN, cmod='eq', cfile=None,
            wmod=0, filOUT=None, verbose=False):
     '''
@@ -1166,100 +1675,61 @@ def wclean(filIN, cmod='eq', cfile=None,
     wave = ds.wave
     Nw = len(wave)
     
-    ind = [] # list of indices of wvl to remove
+    keep = np.ones(Nw, dtype=bool) # mask of wvl to keep
     if cfile is not None:
         # indarxiv = IO.read_csv(cfile, 'Ind')[0]
         indarxiv = ascii.read(cfile+csvext)['Ind']
-        ind = []
-        for i in indarxiv:
-            ind.append(int(i))
+        keep[np.asarray(indarxiv, dtype=np.intp)] = False
     else:
         ## Detect crossing wvl
         ##---------------------
-        for i in range(Nw-1):
-            if wave[i]>=wave[i+1]: # found wave(i+1), i_max=Nw-2
-                
-                wmin = -1 # lower limit: closest wave smaller than wave[i+1]
-                wmax = 0 # upper limit: closest wave larger than wave[i]
-                
-                for j in range(i+1):
-                    dw = wave[i+1] - wave[i-j]
-                    if dw>0: # found the closest smaller wave[i-j]
-                        wmin = i-j
-                        break # only the innermost loop
-                if wmin==-1:
-                    warnings.warn('Left side fully covered! ')
-                
-                for j in range(Nw-i-1):
-                    dw = wave[i+1+j] - wave[i]
-                    if dw>0: # found the closest larger wave[i+1+j]
-                        wmax = i+1+j
-                        break
-                if wmax==0:
-                    warnings.warn('Right side fully covered! ')
-
-                Nw_seg = wmax-wmin-1 # number of crossing wvl in segment
-                wave_seg = [] # a segment (every detect) of wave
-                ind_seg = [] # corresponing segment for sort use
-                for k in range(Nw_seg):
-                    wave_seg.append(wave[wmin+1+k])
-                    ind_seg.append(wmin+1+k)
-                ## index list of sorted wave_seg
-                ilist = sorted(range(len(wave_seg)), key=wave_seg.__getitem__)
-                ## index of wave_seg center
-                icen = math.floor((Nw_seg-1)/2)
-
-                ## Visualisation (for test use)
-                ##------------------------------
-                # print('wave, i: ', wave[i], i)
-                # print('wave_seg: ', wave_seg)
-                # print('ind_seg: ', ind_seg)
-                # print('ilist: ', ilist)
-                # print('icen: ', icen)
-
-                ## Remove all crossing wvl between two channels
-                ##----------------------------------------------
-                if cmod=='all': # most conservative but risk having holes
-                    pass
-                ## Remove (almost) equal wvl (NOT nb of wvl!) for both sides
-                ##-----------------------------------------------------------
-                elif cmod=='eq': # (default)
-                    ## Select ascendant pair closest to segment center
-                    for k in range(icen):
-                        if ilist[icen]>ilist[0]: # large center
-                            if ilist[icen-k]<ilist[0]:
-                                for p in range(ilist[icen-k]+1):
-                                    del ind_seg[0]
-                                for q in range(Nw_seg-ilist[icen]):
-                                    del ind_seg[-1]
-                                break
-                        else: # small center
-                            if ilist[icen+k]>ilist[0]:
-                                for p in range(ilist[icen]+1):
-                                    del ind_seg[0]
-                                for q in range(Nw_seg-ilist[icen+k]):
-                                    del ind_seg[-1]
-                                break
-                ## Leave 2 closest wvl not crossing
-                ##----------------------------------
-                elif cmod=='closest_left':
-                    for k in range(ilist[0]):
-                        del ind_seg[0]
-                elif cmod=='closest_right':
-                    for k in range(Nw_seg-ilist[0]):
-                        del ind_seg[-1]
-                ## Others
-                ##--------
-                else:
-                    raise ValueError('Non-supported clean mode! ')
-
-                # print('ind_seg (final): ', ind_seg)
-                ind.extend(ind_seg)
+        warr = np.asarray(wave)
+        ## found wave(i+1), i_max=Nw-2
+        for i in np.flatnonzero(warr[:-1]>=warr[1:]):
+            
+            ## lower limit: closest wave smaller than wave[i+1]
+            smaller = np.flatnonzero(warr[:i+1]<warr[i+1])
+            if len(smaller)>0:
+                wmin = smaller[-1]
+            else:
+                wmin = -1
+                warnings.warn('Left side fully covered! ')
+            
+            ## upper limit: closest wave larger than wave[i]
+            larger = np.flatnonzero(warr[i+1:]>warr[i])
+            if len(larger)>0:
+                wmax = i+1+larger[0]
+            else:
+                wmax = 0
+                warnings.warn('Right side fully covered! ')
+
+            Nw_seg = wmax-wmin-1 # number of crossing wvl in segment
+            ## a segment (every detect) of wave
+            ## & corresponing segment for sort use
+            wave_seg = warr[wmin+1:wmax]
+            ## index list of sorted wave_seg
+            ilist = np.argsort(wave_seg, kind='stable')
+            ## index of wave_seg center
+            icen = math.floor((Nw_seg-1)/2)
+
+            ## Visualisation (for test use)
+            ##------------------------------
+            # print('wave, i: ', wave[i], i)
+            # print('wave_seg: ', wave_seg)
+            # print('ilist: ', ilist)
+            # print('icen: ', icen)
+
+            ## Trim the segment ends (trimmed wvl are kept)
+            ##---------------------------------------------
+            front, back = wclean_trim(ilist, icen, Nw_seg, cmod)
+            keep[wmin+1+front:wmax-back] = False
 
     ## Do clean
     ##----------
-    data_new = np.delete(data, ind, axis=0)
-    wave_new = list(np.delete(np.array(wave), ind))
+    ## (boolean mask: one pass over data)
+    data_new = np.ascontiguousarray(data[keep])
+    wave_new = np.asarray(wave)[keep].tolist()
+    ind = np.flatnonzero(~keep) # indices of removed wvl
 
     ## Display clean detail
     ##----------------------
@@ -1276,24 +1746,24 @@ def wclean(filIN, cmod='eq', cfile=None,
     if filOUT is not None:
         # comment = 'Wavelength removal info in _wclean_info.csv'
         IO.write_fits(filOUT, header=hdr, data=data_new,
-                      wave=wave_new, wmod=self.wmod, filext=self.filext) # hdr auto changed
+                      wave=wave_new, wmod=wmod) # hdr auto changed
         
         ## Write csv file
-        wlist = []
-        for i in ind:
-            wlist.append([i, wave[i]])
+        wlist = np.column_stack((ind, np.asarray(wave)[ind]))
         IO.write_csv(filOUT+'_wclean_info',
                      header=['Ind', 'Wavelengths'], dset=wlist)
 
     return data_new, wave_new
 
-def interfill(arr, axis):
+def interfill(arr, axis, order=4, Nworkers=None):
     '''
     FILL undersampling/artificial gap by (bspl)INTERpolation
 
     --- INPUT ---
     arr         array
     axis        axis along which interpolation
+    order       B-spline degree (Default: 4)
+    Nworkers    number of threads (Default: half of the CPUs)
     --- OUTPUT ---
     newarr      new array
     '''
@@ -1301,53 +1771,36 @@ def interfill(arr, axis):
 
     axsh = arr.shape
     NAXIS = np.size(axsh)
-    newarr = np.copy(arr)
     if NAXIS==1: # 1D array
-        x = np.arange(axsh[0])
-        for i in range(axsh[0]):
-            newarr = MA.bsplinterp(x, arr, x)
-    if NAXIS==2: # no wavelength
-        if axis==0: # col direction
-            y = np.arange(axsh[0])
-            for i in range(axsh[1]):
-                col = MA.bsplinterp(y, arr[:,i], y)
-                for j in range(axsh[0]):
-                    newarr[j,i] = col[j]
-        elif axis==1: # row direction
-            x = np.arange(axsh[1])
-            for j in range(axsh[0]):
-                row = MA.bsplinterp(x, arr[j,:], x)
-                for i in range(axsh[1]):
-                    newarr[j,i] = row[i]
-        else:
-            raise ValueError('Unknown axis! ')
-    elif NAXIS==3:
-        if axis==0: # fill wavelength
-            z = np.arange(axsh[0])
-            for i in range(axsh[2]):
-                for j in range(axsh[1]):
-                    wvl = MA.bsplinterp(z, arr[:,j,i], z)
-                    for k in range(axsh[0]):
-                        newarr[k,j,i] = wvl[k]
-        elif axis==1: # col direction
-            y = np.arange(axsh[1])
-            for k in range(axsh[0]):
-                for i in range(axsh[2]):
-                    col = MA.bsplinterp(y, arr[k,:,i], y)
-                    for j in range(axsh[1]):
-                        newarr[k,j,i] = col[j]
-        elif axis==2: # row direction
-            x = np.arange(axsh[2])
-            for k in range(axsh[0]):
-                for j in range(axsh[1]):
-                    row = MA.bsplinterp(x, arr[k,j,:], x)
-                    for i in range(axsh[2]):
-                        newarr[k,j,i] = row[i]
-        else:
+        axis = 0
+    elif NAXIS==2 or NAXIS==3:
+        if axis not in range(NAXIS):
             raise ValueError('Unknown axis! ')
     else:
         raise ValueError('Non-supported array shape! ')
 
+    ## Vectors along axis as columns (gap-free ones are kept as is)
+    Nvec = axsh[axis]
+    vecs = np.moveaxis(arr, axis, 0)
+    shape = vecs.shape
+    vecs = vecs.reshape((Nvec,-1))
+    newvecs = np.empty(vecs.shape, dtype=np.result_type(arr.dtype, np.float32))
+    hasgap = (np.isnan(vecs) | (vecs==0)).any(axis=0)
+    gap = np.flatnonzero(hasgap)
+    newvecs[:,~hasgap] = vecs[:,~hasgap]
+
+    ## Batched B-spline fits (column chunks in parallel)
+    if Nworkers is None:
+        Nworkers = max(os.cpu_count()//2, 1)
+    x = np.arange(Nvec)
+    def fill(cols):
+        newvecs[:,cols] = MA.bsplinterp(x, vecs[:,cols], x, k=order)
+    if len(gap)>0:
+        chunks = np.array_split(gap, min(Nworkers, len(gap)))
+        with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+            list(executor.map(fill, chunks))
+    newarr = np.ascontiguousarray(np.moveaxis(newvecs.reshape(shape), 0, axis))
+
     return newarr
 
 def concatenate(flist, filOUT=None, comment=None,
@@ -1366,80 +1819,94 @@ def concatenate(flist, filOUT=None, comment=None,
                    (7.57, 14.28), # sl1
                    (14.29, 20.66), # ll2
                    (20.67, 38.00), ] # ll1
-    wmin = []
-    wmax = []
-    for i in range(len(wrange)):
-        wmin.append(wrange[i][0])
-        wmax.append(wrange[i][1])
+    ## Range limits as arrays (nearest one found per file)
+    wmin = np.array([w[0] for w in wrange])
+    wmax = np.array([w[1] for w in wrange])
     
     ## Read data
     wave = []
     data = []
 
-    maskall = 0
+    maskall = None
     ## Keep all wavelengths and sort them in ascending order
     if wsort==True:
         for f in flist:
-            ds = IO.read_fits(f)
+            fi = IO.read_fits(f)
             data.append(fi.data)
             wave.append(fi.wave)
-            ## If one fragment all NaN, mask
-            maskall = np.logical_or(maskall,
-                                    np.isnan(fi.data).all(axis=0))
+            ## If one fragment all NaN, mask (only needed without keepfrag)
+            ## (accumulated in place)
+            if not keepfrag:
+                allnan = np.isnan(fi.data).all(axis=0)
+                if maskall is None:
+                    maskall = allnan
+                else:
+                    maskall |= allnan
     ## Keep wavelengths in the given ranges (wrange)
     else:
         for f in flist:
             fi = IO.read_fits(f)
-            imin = LA.closest(wmin, fi.wave[0])
-            imax = LA.closest(wmax, fi.wave[-1])
-            iwi = 0
-            iws = -1
-            for i, w in enumerate(fi.wave[:-2]):
-                if w<wmin[imin] and fi.wave[i+1]>wmin[imin]:
-                    iwi = i+1
-                if w<wmax[imax] and fi.wave[i+1]>wmax[imax]:
-                    iws = i+1
+            imin = np.argmin(np.abs(wmin-fi.wave[0])) # same as LA.closest
+            imax = np.argmin(np.abs(wmax-fi.wave[-1]))
+            ## First wavelength above the limits (binary search, ascending wave)
+            ## wave[i-1]<limit<wave[i], with 1<=i<=Nw-2, otherwise not cut
+            Nw = len(fi.wave)
+            iwi = int(np.searchsorted(fi.wave, wmin[imin], side='right'))
+            if not (1<=iwi<=Nw-2 and fi.wave[iwi-1]<wmin[imin]):
+                iwi = 0
+            iws = int(np.searchsorted(fi.wave, wmax[imax], side='right'))
+            if not (1<=iws<=Nw-2 and fi.wave[iws-1]<wmax[imax]):
+                iws = -1
             data.append(fi.data[iwi:iws])
             wave.append(fi.wave[iwi:iws])
-            ## If one fragment all NaN, mask
-            maskall = np.logical_or(maskall,
-                                    np.isnan(fi.data).all(axis=0))
+            ## If one fragment all NaN, mask (only needed without keepfrag)
+            ## (accumulated in place)
+            if not keepfrag:
+                allnan = np.isnan(fi.data).all(axis=0)
+                if maskall is None:
+                    maskall = allnan
+                else:
+                    maskall |= allnan
 
-    data = np.concatenate(data, axis=0)
     wave = np.concatenate(wave)
     hdr = fi.header
     ## Sort
-    ind = sorted(range(len(wave)), key=wave.__getitem__)
+    ind = np.argsort(wave, kind='stable') # file order kept for equal wvl
     # wave = np.sort(wave)
     wave = wave[ind]
-    data = data[ind]
+    ## Fragments written straight to their sorted positions
+    ## (no intermediate unsorted cube)
+    pos = np.empty_like(ind)
+    pos[ind] = np.arange(len(ind))
+    frags = data
+    data = np.empty((len(wave),)+frags[0].shape[1:],
+                    dtype=np.result_type(*frags))
+    i0 = 0
+    for frag in frags:
+        data[pos[i0:i0+len(frag)]] = frag
+        i0 += len(frag)
     ## NaN mask
     if not keepfrag:
-        for k in range(len(wave)):
-            data[k][maskall] = np.nan
+        data[:,maskall] = np.nan
 
     if cropedge:
         reframe = improve(header=hdr, images=data, wave=wave)
-        xlist = []
-        for x in range(reframe.Nx):
-            if not np.isnan(reframe.im[:,:,x]).all():
-                xlist.append(x)
-        ylist = []
-        for y in range(reframe.Ny):
-            if not np.isnan(reframe.im[:,y,:]).all():
-                ylist.append(y)
-        xmin = min(xlist)
-        xmax = max(xlist)+1
-        ymin = min(ylist)
-        ymax = max(ylist)+1
+        ## Columns/rows with data (one reduction over the cube)
+        valid = (~np.isnan(reframe.images)).any(axis=0)
+        xvalid = valid.any(axis=0)
+        yvalid = valid.any(axis=1)
+        xmin = np.argmax(xvalid)
+        xmax = reframe.Nx - np.argmax(xvalid[::-1])
+        ymin = np.argmax(yvalid)
+        ymax = reframe.Ny - np.argmax(yvalid[::-1])
         dx = xmax-xmin
         dy = ymax-ymin
         x0 = xmin+dx/2
         y0 = ymin+dy/2
 
         reframe.crop(sizpix=(dx,dy), cenpix=(x0,y0))
-        data = reframe.im
-        hdr = reframe.hdr
+        data = reframe.images
+        hdr = reframe.header
         cropcenter = (x0,y0)
         cropsize = (dx,dy)
     else:
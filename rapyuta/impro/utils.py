@@ -6,18 +6,28 @@
 Utilities for impro
 
     improve:
-        reinit, BGunc, 
-        rand_norm, rand_splitnorm, rand_pointing, 
+        reinit, refresh_wcs, update_wcs, BGunc, 
+        rand_norm, noise_buffer, rand_splitnorm, rand_batch, rand_pointing, 
         slice, slice_inv_sq, crop, rebin, groupixel
         smooth, artifact, mask
+    rebin_frac, rebin_box, ftype, welford, welford_std, bounded_map,
+    reproject_fast
 
 """
 
+from tqdm import trange
 import os
 import math
+from pathlib import Path
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from scipy.interpolate import interp1d
+from scipy.ndimage import map_coordinates
 from astropy import wcs
+from astropy.io import fits
+from astropy.wcs.utils import pixel_to_pixel
+from reproject.utils import parse_input_data
 import warnings
 
 ## Local
@@ -41,14 +51,18 @@ class improve:
     def __init__(self, filIN=None, header=None, images=None,
                  wave=None, wmod=0, whdr=None,
                  filUNC=None, verbose=False, filext=fitsext,
-                 instr=None, instr_auto=True):
+                 instr=None, instr_auto=True, seed=None, memmap=False):
         '''
         filUNC - if not None, should be full name with ".fits"!
+        seed - seed of the random generator used by rand_* (Default: None)
+        memmap - memory-map filIN (Default: False - read in memory)
+                 True pages in only the accessed planes/regions,
+                 but keeps the file open while self.images is in use
 
         self: filIN, header, images, wave, wmod, whdr,
-              filUNC, verbose, filext, instr, instr_auto
+              filUNC, verbose, filext, instr, instr_auto, memmap
               ## [derived]
-              unc, wcs, cdelt, pc, cd, Ndim, Nx, Ny, Nw, 
+              unc, wcs, cdelt, pc, cd, Ndim, Nx, Ny, Nw, rng
         '''
         ## INPUTS
         self.filIN = filIN
@@ -61,12 +75,18 @@ class improve:
         self.verbose = verbose
         self.filext = filext
         self.instr = instr
-        self.instr_auto = self.instr_auto
+        self.instr_auto = instr_auto
+        self.memmap = memmap
+
+        ## Random generator kept for all rand_* calls
+        self.rng = np.random.default_rng(seed)
 
         ## Default initialization
         self.unc = None
-        self.wcs = None
-        self.cdelt, self.pc, self.cd = None, None, None
+        ## wcs, cdelt, pc, cd are parsed on first access
+        self._wcs = None
+        self._wcs_stale = False
+        self._pcdelt = None
         self.Ndim = 2
         self.Nx, self.Ny, self.Nw = 1, 1, 0
 
@@ -74,25 +94,23 @@ class improve:
         if filIN is not None:
             ds = IO.read_fits(filIN, wmod=wmod,
                               instr=instr, instr_auto=instr_auto,
-                              uncfiles=filUNC, filext=filext)
+                              uncfiles=filUNC, filext=filext, memmap=memmap)
             self.header = ds.header
             self.images = ds.data
             self.wave = ds.wave
             self.whdr = ds.whdr
             self.unc = ds.unc
             self.wcs = ds.wcs
-            self.cdelt, self.pc, self.cd = ds.cdelt, ds.pc, ds.cd
             self.Ndim = ds.Ndim
             self.Nx, self.Ny, self.Nw = ds.Nx, ds.Ny, ds.Nw
         else:
             ## self.unc
             filUNC = LA.listize(filUNC)
             unc = []
-            for uncf in filUNC:
-                if Path(uncf).exists():
-                    self.unc = IO.read_fits(uncf, filext='').data
-                    # with fits.open(uncf) as hdul:
-                    #     unc.append(hdul[0].data)
+            if filUNC is not None:
+                for uncf in filUNC:
+                    if Path(uncf).exists():
+                        unc.append(IO.read_fits(uncf, filext='').data)
             if len(unc)==0:
                 ## no unc
                 self.unc = None
@@ -103,19 +121,8 @@ class improve:
                 ## asymmetric unc
                 self.unc = unc
             
-            ## self.wcs
-            if header is not None:
-                try:
-                    self.wcs = wcs.WCS(header)
-                except:
-                    self.wcs = patch_wcs_3D(header=header).wcs
-            
-            ## self: cdelt, pc, cd
-            if self.wcs is not None:
-                pcdelt = get_pc(wcs=w.wcs)
-                self.cdelt = pcdelt.cdelt
-                self.pc = pcdelt.pc
-                self.cd = pcdelt.cd
+            ## self: wcs, cdelt, pc, cd (lazy)
+            self.refresh_wcs()
 
             ## self: Ndim, Nx, Ny, Nw
             if self.images is not None:
@@ -141,6 +148,10 @@ class improve:
         Update init variables
 
         filUNC - if not None, should be full name with ".fits"!
+        seed - reseed self.rng
+        memmap - memory-map filIN (see __init__)
+        refresh_wcs - if False, header update does not re-parse WCS
+                      (Default: True)
         '''
         ## flags for updating derived instances (self)
         flag_wcs = False
@@ -174,19 +185,23 @@ class improve:
             self.instr = kwargs['instr']
         if 'instr_auto' in kwargs:
             self.instr_auto = kwargs['instr_auto']
+        if 'seed' in kwargs:
+            self.rng = np.random.default_rng(kwargs['seed'])
+        if 'memmap' in kwargs:
+            self.memmap = kwargs['memmap']
 
         ## filIN update: all
         if ('filIN' in kwargs) and (self.filIN is not None):
             ds = IO.read_fits(self.filIN, wmod=self.wmod,
                               instr=self.instr, instr_auto=self.instr_auto,
-                              uncfiles=self.filUNC, filext=self.filext)
+                              uncfiles=self.filUNC, filext=self.filext,
+                              memmap=self.memmap)
             self.header = ds.header
             self.images = ds.data
             self.wave = ds.wave
             self.whdr = ds.whdr
             self.unc = ds.unc
             self.wcs = ds.wcs
-            self.cdelt, self.pc, self.cd = ds.cdelt, ds.pc, ds.cd
             self.Ndim = ds.Ndim
             self.Nx, self.Ny, self.Nw = ds.Nx, ds.Ny, ds.Nw
         else:
@@ -195,11 +210,10 @@ class improve:
                 ## self.unc
                 filUNC = LA.listize(self.filUNC)
                 unc = []
-                for uncf in filUNC:
-                    if Path(uncf).exists():
-                        self.unc = IO.read_fits(uncf, filext='').data
-                        # with fits.open(uncf) as hdul:
-                        #     unc.append(hdul[0].data)
+                if filUNC is not None:
+                    for uncf in filUNC:
+                        if Path(uncf).exists():
+                            unc.append(IO.read_fits(uncf, filext='').data)
                 if len(unc)==0:
                     ## no unc
                     self.unc = None
@@ -210,19 +224,10 @@ class improve:
                     ## asymmetric unc
                     self.unc = unc
             
-            ## header update: self.wcs
-            if flag_wcs and (self.header is not None):
-                try:
-                    self.wcs = wcs.WCS(self.header)
-                except:
-                    self.wcs = patch_wcs_3D(header=self.header).wcs
-
-                ## wcs update: self: cdelt, pc, cd
-                if self.wcs is not None:
-                    pcdelt = get_pc(wcs=w.wcs)
-                    self.cdelt = pcdelt.cdelt
-                    self.pc = pcdelt.pc
-                    self.cd = pcdelt.cd
+            ## header update: self: wcs, cdelt, pc, cd (lazy)
+            ## (skipped if self.wcs was already updated via update_wcs)
+            if flag_wcs and kwargs.get('refresh_wcs', True):
+                self.refresh_wcs()
 
             ## images update: self: Ndim, Nx, Ny, Nw
             if flag_img and (self.images is not None):
@@ -241,8 +246,81 @@ class improve:
             print(f'<improve> file: {filIN}')
             print(f'Raw size (pix): {self.Nx} * {self.Ny}')
 
+    def refresh_wcs(self):
+        '''
+        Mark self: wcs, cdelt, pc, cd out of date after a header change
+        (self.header is parsed again on first access)
+        '''
+        if self.header is not None:
+            self._wcs_stale = True
+            self._pcdelt = None
+
+    @property
+    def wcs(self):
+        if self._wcs_stale:
+            try:
+                self._wcs = wcs.WCS(self.header)
+            except:
+                self._wcs = IO.patch_wcs_3D(header=self.header).wcs
+            self._wcs_stale = False
+        return self._wcs
+
+    @wcs.setter
+    def wcs(self, w):
+        self._wcs = w
+        self._wcs_stale = False
+        self._pcdelt = None
+
+    def _get_pc(self):
+        if self._pcdelt is None and self.wcs is not None:
+            self._pcdelt = IO.get_pc(wcs=self.wcs)
+        return self._pcdelt
+
+    @property
+    def cdelt(self):
+        pcdelt = self._get_pc()
+        return None if pcdelt is None else pcdelt.cdelt
+
+    @property
+    def pc(self):
+        pcdelt = self._get_pc()
+        return None if pcdelt is None else pcdelt.pc
+
+    @property
+    def cd(self):
+        pcdelt = self._get_pc()
+        return None if pcdelt is None else pcdelt.cd
+
+    def update_wcs(self, crpix=None, crval=None, cd=None):
+        '''
+        Update self: wcs, cdelt, pc, cd in place after local header changes
+        (avoid re-parsing the whole header via refresh_wcs)
+
+        ------ INPUT ------
+        crpix               new (CRPIX1, CRPIX2)
+        crval               new (CRVAL1, CRVAL2)
+        cd                  new 2D CD matrix
+        '''
+        w = self.wcs.wcs
+        if crpix is not None:
+            w.crpix[:2] = crpix
+        if crval is not None:
+            w.crval[:2] = crval
+        if cd is not None:
+            if w.has_cd():
+                w.cd[:2,:2] = cd
+            else:
+                ## Same CDELTia + PCi_ja split as a header with CDi_ja
+                pcdelt = IO.get_pc(cd=np.asarray(cd))
+                w.cdelt[:2] = pcdelt.cdelt
+                w.pc[:2,:2] = pcdelt.pc
+        w.set()
+
+        if cd is not None:
+            self._pcdelt = None
+
     def BGunc(self, filOUT=None, filWGT=None, wfac=1.,
-              BG_images=None, BG_weight=None, fill_zeros=np.nan
+              BG_images=None, BG_weight=None, fill_zeros=np.nan,
               filext=fitsext):
         '''
         Estimate uncertainties from the background map
@@ -271,31 +349,41 @@ class improve:
         Nw = self.Nw
 
         ## sigma: std dev of (weighted) flux distribution of bg region
+        ## (plane by plane through one reused float64 buffer,
+        ##  two-pass nanvar whatever the input precision)
+        shape = np.shape(images)
+        planes = np.reshape(images, (-1,)+shape[-2:])
         if BG_weight is not None:
-            if self.Ndim==3:
-                sigma = np.nanstd(images * BG_weight, axis=(1,2))
-            elif self.Ndim==2:
-                sigma = np.nanstd(images * BG_weight)
-        else:
-            if self.Ndim==3:
-                sigma = np.nanstd(images, axis=(1,2))
-            elif self.Ndim==2:
-                sigma = np.nanstd(images)
+            weights = np.broadcast_to(BG_weight, shape).reshape(planes.shape)
+        buf = np.empty(shape[-2:])
+        sigma = np.empty(len(planes))
+        for k in range(len(planes)):
+            if BG_weight is not None:
+                np.multiply(planes[k], weights[k], out=buf)
+            else:
+                buf[...] = planes[k]
+            sigma[k] = np.sqrt(np.nanvar(buf))
+        sigma = sigma.reshape(shape[:-2])
 
         ## wgt: weight map
         if filWGT is not None:
             wgt = IO.read_fits(filWGT, filext='').data * wfac
         else:
-            wgt = np.ones(images.shape) * wfac
+            wgt = wfac
+        ## Computed in the precision of images (e.g. float32)
+        sigma = sigma.astype(ftype(images), copy=False)
 
         ## unc: weighted rms = root of var/wgt
+        ## (written in place into one preallocated array)
+        unc = np.empty(np.broadcast_shapes(np.shape(wgt), images.shape),
+                       dtype=ftype(images))
+        np.reciprocal(wgt, out=unc)
+        np.sqrt(unc, out=unc)
         if self.Ndim==3:
-            unc = []
-            for w in range(Nw):
-                unc.append(np.sqrt(1./wgt[w,:,:]) * sigma(w))
-            unc = np.array(unc)
+            ## sigma (Nw,) broadcast along wavelength axis
+            unc *= sigma[:,np.newaxis,np.newaxis]
         elif self.Ndim==2:
-            unc = np.sqrt(1./wgt) * sigma
+            unc *= sigma
 
         ## Replace zero values
         unc[unc==0] = fill_zeros
@@ -321,14 +409,46 @@ class improve:
         '''
         if self.unc is not None:
             ## unc should have the same dimension with images
-            theta = np.random.normal(mu, sigma, self.images.shape)
-            self.images += theta * self.unc
+            ## Draw only where unc is non-zero (NaN unc still propagates)
+            unc = np.broadcast_to(self.unc, self.images.shape)
+            nz = unc!=0
+            if nz.all():
+                ## theta*unc accumulated in a reused buffer
+                theta = self.noise_buffer(mu, sigma)
+                theta *= unc
+                self.images += theta
+            elif nz.any():
+                theta = self.rng.normal(mu, sigma, np.count_nonzero(nz))
+                self.images[nz] += theta * unc[nz]
         else:
             if self.verbose:
                 warnings.warn('Uncertainty data unavailable. Nothing changed.')
 
         return self.images
 
+    def noise_buffer(self, mu=0., sigma=1.):
+        '''
+        Fill a reused images-sized buffer with N(mu,sigma) draws
+        (same values as self.rng.normal, no new array per call)
+
+        ------ INPUT ------
+        mu                  mean
+        sigma               standard deviation
+        ------ OUTPUT ------
+        buf                 buffer of random numbers
+        '''
+        buf = getattr(self, '_noise', None)
+        if buf is None or buf.shape!=self.images.shape:
+            buf = np.empty(self.images.shape, dtype=ftype(self.images))
+            self._noise = buf
+        self.rng.standard_normal(dtype=buf.dtype, out=buf)
+        if sigma!=1.:
+            buf *= sigma
+        if mu!=0.:
+            buf += mu
+
+        return buf
+
     def rand_splitnorm(self, mu=0., sigma=1.):
         '''
         Add random SN(0,lam,lam*tau) errors to images
@@ -340,36 +460,86 @@ class improve:
         ------ OUTPUT ------
         self.images         error added images
         '''
-        if len(self.unc)==2:
+        if self.unc is not None and len(self.unc)==2:
             unc = self.unc
             ## unc[i] should have the same dimension with images
             tau = unc[1]/unc[0]
             peak = 1/(1+tau)
-            theta = np.random.normal(mu, sigma, self.images.shape) # ~N(0,1)
-            flag = np.random.random(self.images.shape) # ~U(0,1)
-            if self.Ndim==2:
-                for x in range(self.Nx):
-                    for y in range(self.Ny):
-                        if flag[y,x]<peak[y,x]:
-                            self.images[y,x] += -abs(theta[y,x]) * unc[0][y,x]
-                        else:
-                            self.images[y,x] += abs(theta[y,x]) * unc[1][y,x]
-            elif self.Ndim==3:
-                for x in range(self.Nx):
-                    for y in range(self.Ny):
-                        for k in range(self.Nw):
-                            if flag[k,y,x]<peak[k,y,x]:
-                                self.images[k,y,x] += -abs(
-                                    theta[k,y,x]) * unc[0][k,y,x]
-                            else:
-                                self.images[k,y,x] += abs(
-                                    theta[k,y,x]) * unc[1][k,y,x]
+            theta = self.noise_buffer(mu, sigma) # ~N(0,1)
+            flag = self.rng.random(self.images.shape) < peak # ~U(0,1)<peak
+            ## Negative side if flag, positive side otherwise (2D & 3D)
+            ## |theta| scaled in place by the side-dependent unc
+            np.abs(theta, out=theta)
+            np.multiply(theta, -unc[0], out=theta, where=flag)
+            np.multiply(theta, unc[1], out=theta, where=~flag)
+            self.images += theta
         else:
             if self.verbose:
                 warnings.warn('Uncertainty data unavailable. Nothing changed.')
 
         return self.images
 
+    def rand_batch(self, jlist, dist='norm', mu=0., sigma=1.,
+                   seed=None, Nworkers=None):
+        '''
+        Draw a batch of error-added realisations of images
+        (one independent random stream per realisation, filled in threads)
+
+        self.images unchanged
+        ------ INPUT ------
+        jlist               realisation indices (int N - range(N))
+                              draw in bounded batches to limit memory
+        dist                error distribution (Default: 'norm')
+                              'norm' - N(mu,sigma) (see rand_norm)
+                              'splitnorm' - SN(0,lam,lam*tau) (see rand_splitnorm)
+        mu                  mean
+        sigma               standard deviation
+        seed                entropy of the SeedSequence
+                              (Default: None - drawn from self.rng)
+                              realisation j is the same whatever the batch
+        Nworkers            number of threads (Default: None - half of CPUs)
+        ------ OUTPUT ------
+        mc                  (len(jlist),)+images.shape array of realisations
+        '''
+        if np.isscalar(jlist):
+            jlist = range(jlist)
+        mc = np.empty((len(jlist),)+self.images.shape, dtype=ftype(self.images))
+        mc[:] = self.images
+
+        if self.unc is None or (dist=='splitnorm' and len(self.unc)!=2):
+            if self.verbose:
+                warnings.warn('Uncertainty data unavailable. Nothing changed.')
+            return mc
+
+        if dist=='splitnorm':
+            unc = self.unc
+            tau = unc[1]/unc[0]
+            peak = 1/(1+tau)
+        if seed is None:
+            seed = self.rng.integers(2**63)
+
+        def draw(i):
+            ## Stream j of the seed (same as SeedSequence(seed).spawn(N)[j])
+            rng = np.random.default_rng(
+                np.random.SeedSequence(seed, spawn_key=(int(jlist[i]),)))
+            theta = rng.standard_normal(self.images.shape, dtype=mc.dtype)
+            theta *= sigma
+            theta += mu
+            if dist=='splitnorm':
+                flag = rng.random(self.images.shape) < peak
+                np.abs(theta, out=theta)
+                theta *= np.where(flag, -unc[0], unc[1])
+                mc[i] += theta
+            else:
+                mc[i] += theta * self.unc
+
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
+        with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+            list(executor.map(draw, range(len(jlist))))
+
+        return mc
+
     def rand_pointing(self, accrand=0, filltype='near',
                       xscale=1, yscale=1):
         '''
@@ -398,8 +568,8 @@ class improve:
         ##------------------------------------------------------------------------
         # WCS increments: d_ro * cos(d_phi) and d_ro * sin(d_phi)
         accrand /= 3600.
-        d_ro = abs(np.random.normal(0., accrand)) # N(0,accrand)
-        d_phi = np.random.random() * 2. * np.pi # U(0,2*pi)
+        d_ro = abs(self.rng.normal(0., accrand)) # N(0,accrand)
+        d_phi = self.rng.random() * 2. * np.pi # U(0,2*pi)
         # d_ro, d_phi = 0.0002, 4.5
         # print('d_ro, d_phi = ', d_ro, d_phi)
         
@@ -634,7 +804,8 @@ class improve:
             
         return self.images
 
-    def slice(self, filSLC, postfix='', filext=fitsext):
+    def slice(self, filSLC, postfix='', filext=fitsext, skip_nan=False,
+              Nworkers=None):
         '''
         Slice a cube
 
@@ -642,26 +813,47 @@ class improve:
         filSLC              filename root of sliced images
         postfix             postfix after filSLC+"_0000", before ".fits"
         filext              suffix of sliced image filename (Default: ".fits")
+        skip_nan            do not write all-NaN slices (Default: False)
+        Nworkers            number of threads (Default: None - half of CPUs)
         ------ OUTPUT ------
         slcnames            list of sliced image filenames
+                              (None for skipped slices, aligned with wave)
         '''
         ## 3D cube slicing
         slcnames = []
         if self.Ndim==3:
-            for k in range(self.Nw):
-                ## output filename list
-                fname = filSLC+'_'+'0'*(4-len(str(k+1)))+str(k+1)+postfix
-                slcnames.append(fname+filext)
-                hd2D = patch_wcs_3D(header=self.header).header
-                IO.write_fits(fname, header=hd2D, data=self.images[k,:,:],
+            hd2D = IO.patch_wcs_3D(header=self.header).header
+            ## output filename list
+            fnames = [filSLC+'_'+'0'*(4-len(str(k+1)))+str(k+1)+postfix
+                      for k in range(self.Nw)]
+            slcnames = [fname+filext for fname in fnames]
+
+            def write_slice(k):
+                ## Empty slice (stops at the first finite value)
+                if skip_nan and not np.isfinite(self.images[k,:,:]).any():
+                    return False
+                IO.write_fits(fnames[k], header=hd2D, data=self.images[k,:,:],
                               filext=filext)
+                return True
+            
+            ## Independent slices written in parallel (I/O bound)
+            if Nworkers is None:
+                Nworkers = max(os.cpu_count()//2, 1)
+            with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+                written = list(executor.map(write_slice, range(self.Nw)))
+            
+            skipped = [k for k in range(self.Nw) if not written[k]]
+            for k in skipped:
+                slcnames[k] = None
+            if self.verbose and len(skipped)>0:
+                print(f'All-NaN slices not written: {skipped}')
         elif self.Ndim==2:
             if self.verbose:
                 warnings.warn('2D image cannot be sliced. Nothing changed.')
 
         return slcnames
 
-    def slice_inv_sq(self, filSLC, postfix='', filext=fitsext):
+    def slice_inv_sq(self, filSLC, postfix='', filext=fitsext, Nworkers=None):
         '''
         Slice a cube with its inversed square
 
@@ -669,21 +861,31 @@ class improve:
         filSLC              filename root of sliced images
         postfix             postfix after filSLC+"_0000", before ".fits"
         filext              suffix of sliced image filename (Default: ".fits")
+        Nworkers            number of threads (Default: None - half of CPUs)
         ------ OUTPUT ------
         slcnames            list of sliced image filenames
         '''
         ## Inversed square cube slicing
-        inv_sq = 1./self.images**2
-        
         slcnames = []
         if self.Ndim==3:
-            for k in range(self.Nw):
-                ## output filename list
-                fname = filSLC+'_'+'0'*(4-len(str(k+1)))+str(k+1)+postfix
-                slcnames.append(fname+filext)
-                hd2D = patch_wcs_3D(header=self.header).header
-                IO.write_fits(fname, header=hd2D, data=inv_sq[k,:,:],
+            hd2D = IO.patch_wcs_3D(header=self.header).header
+            ## output filename list
+            fnames = [filSLC+'_'+'0'*(4-len(str(k+1)))+str(k+1)+postfix
+                      for k in range(self.Nw)]
+            slcnames = [fname+filext for fname in fnames]
+
+            def write_slice(k):
+                ## Plane-wise (no cube-sized temporaries), in place
+                inv_sq = np.square(self.images[k,:,:])
+                np.reciprocal(inv_sq, out=inv_sq)
+                IO.write_fits(fnames[k], header=hd2D, data=inv_sq,
                               filext=filext)
+            
+            ## Independent slices written in parallel (I/O bound)
+            if Nworkers is None:
+                Nworkers = max(os.cpu_count()//2, 1)
+            with ThreadPoolExecutor(max_workers=Nworkers) as executor:
+                list(executor.map(write_slice, range(self.Nw)))
         elif self.Ndim==2:
             if self.verbose:
                 warnings.warn('2D image cannot be sliced. Nothing changed.')
@@ -709,20 +911,27 @@ class improve:
         
         ## Crop center
         ##-------------
+        ## Linear transformation unless distortions (SIP, etc.) are present
+        if self.wcs.has_distortion:
+            world2pix = self.wcs.all_world2pix
+            pix2world = self.wcs.all_pix2world
+        else:
+            world2pix = self.wcs.wcs_world2pix
+            pix2world = self.wcs.wcs_pix2world
         if cenpix is None:
             if cenval is None:
                 UT.strike('improve.crop', 'miss crop center', cat='InputError')
             else:
                 ## Convert coord
                 try:
-                    cenpix = np.array(self.w.all_world2pix(cenval[0], cenval[1], 1))
+                    cenpix = np.array(world2pix(cenval[0], cenval[1], 1))
                 except wcs.wcs.NoConvergence as e:
                     cenpix = e.best_solution
                     print("Best solution:\n{0}".format(e.best_solution))
                     print("Achieved accuracy:\n{0}".format(e.accuracy))
                     print("Number of iterations:\n{0}".format(e.niter))
         else:
-            cenval = self.w.all_pix2world(np.array([cenpix]), 1)[0]
+            cenval = pix2world(np.array([cenpix]), 1)[0]
         if not (0<cenpix[0]-0.5<self.Nx and 0<cenpix[1]-0.5<self.Ny):
             UT.strike('improve.crop', 'crop centre overpassed the image edge.',
                       cat='ValueError')
@@ -734,10 +943,10 @@ class improve:
                 UT.strike('improve.crop', 'miss crop size', cat='InputError')
             else:
                 ## CDELTn needed (Physical increment at the reference pixel)
-                sizpix = np.array(sizval) / abs(self.cdelt)
-                sizpix = np.array([math.floor(n) for n in sizpix])
+                sizpix = np.floor(np.asarray(sizval) / np.abs(self.cdelt))
         else:
             sizval = np.array(sizpix) * abs(self.cdelt)
+        sizpix = np.asarray(sizpix).astype(np.intp)
 
         if self.verbose==True:
             print('----------')
@@ -749,12 +958,12 @@ class improve:
         
         ## Lowerleft origin
         ##------------------
-        xmin = math.floor(cenpix[0] - sizpix[0]/2.)
-        ymin = math.floor(cenpix[1] - sizpix[1]/2.)
-        xmax = xmin + sizpix[0]
-        ymax = ymin + sizpix[1]
+        mins = np.floor(np.asarray(cenpix) - sizpix/2.).astype(np.intp)
+        maxs = mins + sizpix
+        xmin, ymin = mins
+        xmax, ymax = maxs
 
-        if not (xmin>=0 and xmax<=self.Nx and ymin>=0 and ymax<=self.Ny):
+        if not ((mins>=0) & (maxs<=[self.Nx, self.Ny])).all():
             UT.strike('improve.crop', 'crop region overpassed the image edge.',
                       cat='ValueError')
 
@@ -768,8 +977,9 @@ class improve:
 
         ## Modify header
         ##---------------
-        newheader['CRPIX1'] = math.floor(sizpix[0]/2. + 0.5)
-        newheader['CRPIX2'] = math.floor(sizpix[1]/2. + 0.5)
+        crpix = np.floor(sizpix/2. + 0.5).astype(np.intp)
+        newheader['CRPIX1'] = int(crpix[0])
+        newheader['CRPIX2'] = int(crpix[1])
         newheader['CRVAL1'] = cenval[0]
         newheader['CRVAL2'] = cenval[1]
         
@@ -783,8 +993,10 @@ class improve:
             IO.write_fits(filOUT, self.header, self.images, self.wave, self.wmod)
 
         ## Update self variables
+        self.update_wcs(crpix=(newheader['CRPIX1'], newheader['CRPIX2']),
+                        crval=(newheader['CRVAL1'], newheader['CRVAL2']))
         self.reinit(header=self.header, images=self.images, wave=self.wave,
-                    wmod=self.wmod, verbose=self.verbose)
+                    wmod=self.wmod, verbose=self.verbose, refresh_wcs=False)
 
         return self.images
 
@@ -813,8 +1025,6 @@ class improve:
         '''
         oldimage = self.images
         newheader = self.header
-        oldheader = self.header.copy()
-        oldw = self.w
         # cd = w.pixel_scale_matrix
         oldcd = self.cd
         oldcdelt = self.cdelt
@@ -861,11 +1071,9 @@ class improve:
         newheader['CD1_2'] = cd[0][1]
         newheader['CD2_2'] = cd[1][1]
     
-        for kw in oldheader.keys():
-            if 'PC' in kw:
-                del newheader[kw]
-            if 'CDELT' in kw:
-                del newheader[kw]
+        ## Keywords collected once, no header copy needed
+        for kw in [kw for kw in newheader.keys() if ('PC' in kw) or ('CDELT' in kw)]:
+            del newheader[kw]
             
         # lam = yratio/xratio
         # pix_ratio = xratio*yratio
@@ -883,156 +1091,46 @@ class improve:
         return a.reshape(sh).sum(-1).sum(1)
         '''
 
-        if self.Ndim==3:
-            image_newx = np.zeros((self.Nw,oldNy,Nx))
-            newimage = np.zeros((self.Nw,Ny,Nx))
-            nanbox = np.zeros((self.Nw,Ny,Nx))
-        elif self.Ndim==2:
-            image_newx = np.zeros((oldNy,Nx))
-            newimage = np.zeros((Ny,Nx))
-            nanbox = np.zeros((Ny,Nx))
-
         ## istart/old1, istop/old2, rstart/new1, rstop/new2 are old grid indices
 
         if not extrapol:
             
-            ## Sample x axis
-            ##---------------
-            for x in range(Nx):
-                rstart = x * xratio # float
-                istart = int(rstart) # int
-                frac1 = rstart - istart
-                rstop = rstart + xratio # float
-                if int(rstop)<oldNx:
-                    ## Full covered new pixels
-                    istop = int(rstop) # int
-                    frac2 = 1. - (rstop - istop)
-                else:
-                    ## Upper edge (value 0 for uncovered frac: frac2)
-                    istop = oldNx - 1 # int
-                    frac2 = 0
-            
-                if istart==istop:
-                    ## Shrinking case with old pix containing whole new pix (box averaging)
-                    if self.Ndim==3:
-                        image_newx[:,:,x] = (1.-frac1-frac2) * oldimage[:,:,istart]
-                    elif self.Ndim==2:
-                        image_newx[:,x] = (1.-frac1-frac2) * oldimage[:,istart]
-                else:
-                    ## Other cases (bilinear interpolation)
-                    if self.Ndim==3:
-                        edges = frac1*oldimage[:,:,istart] + frac2*oldimage[:,:,istop]
-                        image_newx[:,:,x] = np.sum(oldimage[:,:,istart:istop+1],axis=2) - edges
-                    elif self.Ndim==2:
-                        edges = frac1*oldimage[:,istart] + frac2*oldimage[:,istop]
-                        image_newx[:,x] = np.sum(oldimage[:,istart:istop+1],axis=1) - edges
-                        
-            ## Sample y axis
-            ##---------------
-            for y in range(Ny):
-                rstart = y * yratio # float
-                istart = int(rstart) # int
-                frac1 = rstart - istart
-                rstop = rstart + yratio # float
-                if int(rstop)<oldNy:
-                    ## Full covered new pixels
-                    istop = int(rstop) # int
-                    frac2 = 1. - (rstop - istop)
-                else:
-                    ## Upper edge (value 0 for uncovered frac: frac2)
-                    istop = oldNy - 1 # int
-                    frac2 = 0
-            
-                if istart==istop:
-                    ## Shrinking case with old pix containing whole new pix (box averaging)
-                    if self.Ndim==3:
-                        newimage[:,y,:] = (1.-frac1-frac2) * image_newx[:,istart,:]
-                    elif self.Ndim==2:
-                        newimage[y,:] = (1.-frac1-frac2) * image_newx[istart,:]
-                else:
-                    ## Other cases (bilinear interpolation)
-                    if self.Ndim==3:
-                        edges = frac1*image_newx[:,istart,:] + frac2*image_newx[:,istop,:]
-                        newimage[:,y,:] = np.sum(image_newx[:,istart:istop+1,:],axis=1) - edges
-                    elif self.Ndim==2:
-                        edges = frac1*image_newx[istart,:] + frac2*image_newx[istop,:]
-                        newimage[y,:] = np.sum(image_newx[istart:istop+1,:],axis=0) - edges
+            if float(xratio).is_integer() and float(yratio).is_integer():
+                ## Integer contraction: box summing (see krebin above)
+                ## Upper edge boxes padded with zeros
+                xfac, yfac = int(xratio), int(yratio)
+                pad = [(0,0)]*(oldimage.ndim-2) + [(0,Ny*yfac-oldNy), (0,Nx*xfac-oldNx)]
+                newimage = np.pad(oldimage, pad)
+                newimage = newimage.reshape(
+                    newimage.shape[:-2]+(Ny,yfac,Nx,xfac)).sum(axis=(-3,-1))
+            else:
+                ## Fraction tables built once per axis, then
+                ## newimage[w,y,x] = sum_j,i ybox[y,j] * xbox[x,i] * oldimage[w,j,i]
+                ## (NaN if any covered old pixel is NaN, as box summing)
+                ## (in the precision of oldimage, e.g. float32)
+                ybox, ycover = rebin_frac(Ny, oldNy, yratio, ftype(oldimage))
+                xbox, xcover = rebin_frac(Nx, oldNx, xratio, ftype(oldimage))
+                mask_nan = np.isnan(oldimage)
+                newimage = ybox @ np.where(mask_nan, 0., oldimage) @ xbox.T
+                Nnan = ycover @ mask_nan.astype(ycover.dtype) @ xcover.T
+                newimage[Nnan>0] = np.nan
 
             if not total:
-                newimage = newimage / (xratio*yratio)
+                newimage = newimage / float(xratio*yratio)
 
         else:
             
-            ## Sample y axis
-            ##---------------
-            for y in range(Ny):
-                rstart = y * yratio # float
-                istart = int(rstart) # int
-                frac1 = rstart - istart
-                rstop = rstart + yratio # float
-                if int(rstop)<oldNy:
-                    ## Full covered new pixels
-                    istop = int(rstop) # int
-                    frac2 = 1. - (rstop - istop)
-                else:
-                    ## Upper edge (value 0 for uncovered frac: frac2)
-                    istop = oldNy - 1 # int
-                    frac2 = (rstop - istop) - 1.
-    
-                ## Sample x axis
-                ##---------------
-                for x in range(Nx):
-                    new1 = x * xratio # float
-                    old1 = int(new1) # int
-                    f1 = new1 - old1
-                    new2 = new1 + xratio # float
-                    if int(new2)<oldNx:
-                        ## Full covered new pixels
-                        old2 = int(new2) # int
-                        f2 = 1. - (new2 - old2)
-                    else:
-                        ## Upper edge (value 0 for uncovered frac: f2)
-                        old2 = oldNx - 1 # int
-                        f2 = (new2 - old2) - 1. # out frac
-
-                    ## For each pixel (x,y) in new grid,
-                    ## find NaNs in old grid and
-                    ## recalculate nanbox[w,y,x] taking into account fractions
-                    for j in range(istop+1-istart):
-                        for i in range(old2+1-old1):
-                                
-                            ## old y grid
-                            if j==0:
-                                ybox = 1.-frac1
-                            elif j==istop-istart:
-                                if int(rstop)<oldNy:
-                                    ybox = 1.-frac2
-                                else:
-                                    ybox = rstop-istop-1.
-                            else:
-                                ybox = 1.
-                                
-                            ## old x grid
-                            if i==0:
-                                xbox = 1.-f1
-                            elif i==old2-old1:
-                                if int(new2)<oldNx:
-                                    xbox = 1.-f2
-                                else:
-                                    xbox = f2
-                            else:
-                                xbox = 1.
-                                
-                            ## old 2D grid
-                            if self.Ndim==3:
-                                for w in range(self.Nw):
-                                    if ~np.isnan(oldimage[w,istart+j,old1+i]):
-                                        newimage[w,y,x] += oldimage[w,istart+j,old1+i] * ybox * xbox
-                                        nanbox[w,y,x] += ybox * xbox
-                            elif self.Ndim==2:
-                                if ~np.isnan(oldimage[istart+j,old1+i]):
-                                    newimage[y,x] += oldimage[istart+j,old1+i] * ybox * xbox
-                                    nanbox[y,x] += ybox * xbox
+            ## Fraction matrices of old pixels covered by new ones
+            ## newimage[w,y,x] = sum_j,i ybox[y,j] * xbox[x,i] * oldimage[w,j,i]
+            ybox = rebin_box(Ny, oldNy, yratio, ftype(oldimage))
+            xbox = rebin_box(Nx, oldNx, xratio, ftype(oldimage))
+
+            ## For each pixel (x,y) in new grid,
+            ## find NaNs in old grid and
+            ## recalculate nanbox[w,y,x] taking into account fractions
+            mask_nan = np.isnan(oldimage)
+            newimage = ybox @ np.where(mask_nan, 0., oldimage) @ xbox.T
+            nanbox = ybox @ (~mask_nan).astype(ybox.dtype) @ xbox.T
 
             if not total:
                 newimage = np.where(nanbox==0, np.nan, newimage/nanbox)
@@ -1043,8 +1141,9 @@ class improve:
                           wave=self.wave, wmod=self.wmod)
 
         ## Update self variables
+        self.update_wcs(crpix=(newheader['CRPIX1'], newheader['CRPIX2']), cd=cd)
         self.reinit(header=newheader, images=newimage, wave=self.wave,
-                    wmod=self.wmod, verbose=self.verbose)
+                    wmod=self.wmod, verbose=self.verbose, refresh_wcs=False)
 
         if self.verbose==True:
             print('----------')
@@ -1174,6 +1273,8 @@ class improve:
         See also specutils.smoothing
         ------ INPUT ------
         filUNC              input uncertainty map (FITS)
+                              if not None, should be full name with ".fits"!
+                              None - estimated by BGunc
         filOUT              output spectral map (FITS)
         BG_images           background images used to generate unc map
         fill_zeros          value used to replace zero value (Default:NaN)
@@ -1188,54 +1289,58 @@ class improve:
         '''
         im = self.images
         wvl = self.wave
-        unc = self.BGunc(filUNC=filUNC,BG_images=BG_images,fill_zeros=fill_zeros)
+        if filUNC is not None:
+            unc = IO.read_fits(filUNC, filext='').data
+        else:
+            unc = self.BGunc(BG_images=BG_images,fill_zeros=fill_zeros)
 
         if wmin is None:
             wmin = wvl[0]
-        iwi = LA.listize(wvl).index(wvl[LA.closest(wvl,wmin)])
+        iwi = LA.closest(wvl,wmin)
         if wmax is None:
             wmax = wvl[-1]
-        iws = LA.listize(wvl).index(wvl[LA.closest(wvl,wmax)])
+        iws = LA.closest(wvl,wmax)
 
         if lim_unc<0:
             raise ValueError('lim_unc must be positive!')
 
-        ## Scan every pixel/spectrum at each wavelength
-        for w in trange(self.Nw, leave=False,
+        ## Spectral median of every pixel (updated where cleaned)
+        v_med = np.median(im[iwi:iws], axis=0)
+
+        ## Scan all pixels/spectra at each wavelength
+        for w in trange(iwi, min(iws+1, self.Nw), leave=False,
                         desc='<improve> Cleaning spectral artifacts'):
-            if w>=iwi and w<=iws:
-                pix_x = []
-                pix_y = []
-                for y in range(self.Ny):
-                    for x in range(self.Nx):
-                        v_med = np.median(im[iwi:iws,y,x])
-                        dv = (im[w,y,x] - v_med) / unc[w,y,x]
-                        if fltr_pn is None or fltr_pn=='p':
-                            if dv > lim_unc:
-                                pix_x.append(x)
-                                pix_y.append(y)
-                        if fltr_pn is None or fltr_pn=='n':
-                            if dv < -lim_unc:
-                                pix_x.append(x)
-                                pix_y.append(y)
-                pix_x = np.array(pix_x)
-                pix_y = np.array(pix_y)
-                
-                ## If the neighbors share the feature, not an artifact
-                for ix, x in enumerate(pix_x):
-                    counter = 0
-                    for iy, y in enumerate(pix_y):
-                        if abs(y-pix_y[ix]+pix_x[iy]-x)<=2:
-                            counter += 1
-                    ## max(counter) == 12
-                    if counter<cmin:
-                        if w==0:
-                            im[w,pix_y[ix],x] = im[w+1,pix_y[ix],x]
-                        elif w==self.Nw-1:
-                            im[w,pix_y[ix],x] = im[w-1,pix_y[ix],x]
-                        else:
-                            im[w,pix_y[ix],x] = (im[w-1,pix_y[ix],x]+im[w+1,pix_y[ix],x])/2
-                            # im[w,pix_y[ix],x] = np.median(im[iwi:iws,pix_y[ix],x])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dv = (im[w] - v_med) / unc[w]
+            flag = np.zeros((self.Ny,self.Nx), dtype=bool)
+            if fltr_pn is None or fltr_pn=='p':
+                flag |= dv > lim_unc
+            if fltr_pn is None or fltr_pn=='n':
+                flag |= dv < -lim_unc
+            pix_y, pix_x = np.nonzero(flag)
+            if len(pix_x)==0:
+                continue
+            
+            ## If the neighbors share the feature, not an artifact
+            ## (counter: flagged pixels with abs((y+x)-(y0+x0))<=2)
+            diag = pix_y + pix_x
+            hist = np.bincount(diag, minlength=self.Ny+self.Nx+3)
+            cumh = np.concatenate(([0], np.cumsum(hist)))
+            counter = cumh[np.minimum(diag+3, len(hist))] - cumh[np.maximum(diag-2, 0)]
+            isart = counter<cmin
+            ys = pix_y[isart]
+            xs = pix_x[isart]
+            if len(xs)==0:
+                continue
+            if w==0:
+                im[w,ys,xs] = im[w+1,ys,xs]
+            elif w==self.Nw-1:
+                im[w,ys,xs] = im[w-1,ys,xs]
+            else:
+                im[w,ys,xs] = (im[w-1,ys,xs]+im[w+1,ys,xs])/2
+                # im[w,ys,xs] = np.median(im[iwi:iws,ys,xs], axis=0)
+            if w<iws:
+                v_med[ys,xs] = np.median(im[iwi:iws,ys,xs], axis=0)
 
         if filOUT is not None:
             comment = "Cleaned by <improve.artifact>"
@@ -1248,3 +1353,241 @@ class improve:
         '''
         '''
         pass
+
+
+##------------------------------------------------
+##
+##               <improve> kernels
+##
+##------------------------------------------------
+
+def rebin_frac(N, oldN, ratio, dtype=float):
+    '''
+    Fraction matrix of old pixels covered by new pixels along one axis
+    (non-extrapol mode of improve.rebin)
+
+    ------ INPUT ------
+    N                   new number of pixels
+    oldN                old number of pixels
+    ratio               expansion (>1) or contraction (<1)
+    dtype               output dtype (Default: float)
+    ------ OUTPUT ------
+    box                 (N,oldN) array of fractions
+    cover               (N,oldN) array of covered old pixels (0 or 1)
+                          i.e. with non-zero fractions
+    '''
+    ## istart/istop, rstart/rstop are old grid indices
+    rstart = np.arange(N) * ratio # float
+    istart = rstart.astype(int) # int
+    frac1 = rstart - istart
+    rstop = rstart + ratio # float
+    inside = rstop.astype(int)<oldN
+    ## Full covered new pixels
+    ## Upper edge (value 0 for uncovered frac: frac2)
+    istop = np.where(inside, rstop.astype(int), oldN-1) # int
+    frac2 = np.where(inside, 1.-(rstop-istop), 0.)
+
+    iold = np.arange(oldN)[np.newaxis,:]
+    cover = ((iold>=istart[:,np.newaxis]) & (iold<=istop[:,np.newaxis])).astype(float)
+    box = cover - frac1[:,np.newaxis]*(iold==istart[:,np.newaxis]) \
+                - frac2[:,np.newaxis]*(iold==istop[:,np.newaxis])
+    ## Zero-fraction neighbours (e.g. istop of integer ratios) not covered
+    ## (their NaNs do not leak, as in the integer box summing)
+    cover = box!=0
+
+    return box.astype(dtype), cover.astype(dtype)
+
+def rebin_box(N, oldN, ratio, dtype=float):
+    '''
+    Fraction matrix of old pixels covered by new pixels along one axis
+    (extrapol mode of improve.rebin)
+
+    ------ INPUT ------
+    N                   new number of pixels
+    oldN                old number of pixels
+    ratio               expansion (>1) or contraction (<1)
+    dtype               output dtype (Default: float)
+    ------ OUTPUT ------
+    box                 (N,oldN) array of fractions
+    '''
+    ## istart/istop, rstart/rstop are old grid indices
+    rstart = np.arange(N) * ratio # float
+    istart = rstart.astype(int) # int
+    frac1 = rstart - istart
+    rstop = rstart + ratio # float
+    inside = rstop.astype(int)<oldN
+    ## Upper edge: istop = oldN-1
+    istop = np.where(inside, rstop.astype(int), oldN-1) # int
+    ## Full covered new pixels: 1-frac2 = rstop-istop
+    ## Upper edge: out frac
+    lastbox = np.where(inside, rstop-istop, rstop-istop-1.)
+
+    iold = np.arange(oldN)[np.newaxis,:]
+    box = np.where(iold==istop[:,np.newaxis], lastbox[:,np.newaxis], 1.)
+    box = np.where(iold==istart[:,np.newaxis], 1.-frac1[:,np.newaxis], box)
+    cover = (iold>=istart[:,np.newaxis]) & (iold<=istop[:,np.newaxis])
+
+    return np.where(cover, box, 0.).astype(dtype)
+
+def ftype(arr):
+    '''
+    Floating dtype to compute with arr
+    (dtype of arr if floating, float64 otherwise; native byte order,
+     FITS data are big-endian)
+    '''
+    arr = np.asarray(arr)
+    if np.issubdtype(arr.dtype, np.floating):
+        return np.dtype(arr.dtype.type)
+    else:
+        return np.dtype(float)
+
+def welford(im, count=None, mean=None, M2=None):
+    '''
+    Update running NaN-skipping mean and M2 with one realisation
+    (Welford's algorithm, arrays updated in place,
+     float64 accumulators whatever the precision of im)
+
+    ------ INPUT ------
+    im                  new realisation
+    count               number of finite values per pixel (Default: None)
+    mean                running mean (Default: None)
+    M2                  running sum of squared deviations (Default: None)
+                          all None to start
+    ------ OUTPUT ------
+    count, mean, M2
+    '''
+    im = np.asarray(im)
+    if count is None:
+        count = np.zeros(im.shape, dtype=int)
+        mean = np.zeros(im.shape, dtype=np.float64)
+        M2 = np.zeros(im.shape, dtype=np.float64)
+    valid = np.isfinite(im)
+    count += valid
+    delta = np.where(valid, im, 0.) - mean
+    delta *= valid
+    mean += delta / np.maximum(count, 1)
+    delta *= np.where(valid, im, 0.) - mean
+    M2 += delta
+
+    return count, mean, M2
+
+def welford_std(count, M2, ddof=0, dtype=None):
+    '''
+    Standard deviation from welford accumulators
+    (NaN where no more than ddof finite values, as np.nanstd)
+    dtype - output dtype (Default: None - as M2)
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(M2 / (count-ddof), dtype=dtype)
+    std[count<=ddof] = np.nan
+
+    return std
+
+def bounded_map(executor, fn, iterable, Nmax):
+    '''
+    executor.map with at most Nmax tasks submitted ahead
+    (results yielded in order: no more than Nmax results
+     wait for a slow consumer, e.g. welford)
+    '''
+    futures = deque()
+    for arg in iterable:
+        if len(futures)>=Nmax:
+            yield futures.popleft().result()
+        futures.append(executor.submit(fn, arg))
+    while futures:
+        yield futures.popleft().result()
+
+## Pixel mappings of reproject_fast, kept for next calls
+## (MC realisations only change the data, not the WCS)
+_pixel_maps = {}
+
+def pixel_map(wcs_in, wcs_out, shape_out):
+    '''
+    Input pixel coordinates of output pixel centres (celestial axes)
+
+    ------ INPUT ------
+    wcs_in              input celestial WCS
+    wcs_out             output celestial WCS
+    shape_out           output shape (Ny,Nx)
+    ------ OUTPUT ------
+    coords              input pixel coordinates [(y,x),Ny,Nx] (read-only)
+    '''
+    shape_out = tuple(shape_out)
+    cache = isinstance(wcs_in, wcs.WCS) and isinstance(wcs_out, wcs.WCS)
+    if cache:
+        key = (wcs_in.to_header_string(relax=True),
+               wcs_out.to_header_string(relax=True), shape_out)
+        if key in _pixel_maps:
+            return _pixel_maps[key]
+
+    yy, xx = np.indices(shape_out, dtype=float)
+    xin, yin = pixel_to_pixel(wcs_out, wcs_in, xx, yy)
+    coords = np.array([yin, xin])
+    coords.setflags(write=False)
+    
+    if cache:
+        if len(_pixel_maps)>=8:
+            _pixel_maps.pop(next(iter(_pixel_maps)))
+        _pixel_maps[key] = coords
+
+    return coords
+
+def reproject_fast(input_data, output_projection, shape_out=None,
+                   return_footprint=True, hdu_in=0,
+                   output_array=None, output_footprint=None, **kwargs):
+    '''
+    Bilinear reprojection with map_coordinates (same call as reproject_interp)
+    Celestial axes only, leading axes (wavelength, realisation)
+    are broadcast; the pixel mapping is computed once per WCS pair
+
+    ------ INPUT ------
+    input_data          FITS file, HDU or (array, WCS/header)
+    output_projection   output header or WCS
+    shape_out           output shape (Default: None - from header)
+    return_footprint    return footprint (Default: True)
+    ------ OUTPUT ------
+    array(, footprint)
+    '''
+    array, wcs_in = parse_input_data(input_data, hdu_in=hdu_in)
+    array = np.asarray(array)
+    if isinstance(output_projection, fits.Header):
+        wcs_out = wcs.WCS(output_projection)
+        if shape_out is None:
+            Naxis = output_projection['NAXIS']
+            shape_out = [output_projection['NAXIS'+str(i)] for i in range(Naxis,0,-1)]
+    else:
+        wcs_out = output_projection
+        if shape_out is None:
+            shape_out = wcs_out.array_shape
+    shape_out = tuple(shape_out)
+    if len(shape_out)==2:
+        shape_out = array.shape[:-2]+shape_out
+    if shape_out[:-2]!=array.shape[:-2]:
+        raise ValueError('reproject_fast: input and output '
+                         'non-celestial axes differ')
+    
+    coords = pixel_map(getattr(wcs_in, 'celestial', wcs_in),
+                       getattr(wcs_out, 'celestial', wcs_out), shape_out[-2:])
+    Ny, Nx = array.shape[-2:]
+    inside = (coords[0]>-.5) & (coords[0]<Ny-.5) & \
+             (coords[1]>-.5) & (coords[1]<Nx-.5)
+
+    planes = array.reshape((-1,)+array.shape[-2:])
+    im = np.empty((len(planes),)+shape_out[-2:], dtype=float)
+    for p, plane in enumerate(planes):
+        map_coordinates(plane, coords, output=im[p],
+                        order=1, mode='nearest', prefilter=False)
+    im[:,~inside] = np.nan
+    im = im.reshape(shape_out)
+    if output_array is not None:
+        output_array[...] = im
+        im = output_array
+
+    if return_footprint:
+        footprint = (~np.isnan(im)).astype(float) # 0 outside or NaN
+        if output_footprint is not None:
+            output_footprint[...] = footprint
+            footprint = output_footprint
+        return im, footprint
+    else:
+        return im
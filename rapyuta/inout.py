@@ -5,7 +5,7 @@
 
 Input & Output
 
-    write_fits, read_fits,
+    write_fits, fits_hdul, fitsio_header, read_fits, read_fits_data,
     arr2tab, tab2arr, get_cd, get_pc, patch_wcs_3D,
     write_hdf5, read_hdf5,
     write_ascii, read_ascii, write_csv, read_csv
@@ -31,6 +31,11 @@ from specutils.spectra import Spectrum1D#, SpectrumList, SpectrumCollection
 # from specutils.io.registers import identify_spectrum_format
 import h5py as H5
 import csv
+## Optional: faster FITS writes (cfitsio)
+try:
+    import fitsio
+except ImportError:
+    fitsio = None
 
 ## Local
 import rapyuta.utbox as UT
@@ -51,7 +56,7 @@ savext = '.sav'
 
 def write_fits(fname, header, data,
                wave=None, wmod=0, whdr=None,
-               filext=fitsext, **hdrl):
+               filext=fitsext, verify=True, use_fitsio=False, **hdrl):
     '''
     Write fits file
 
@@ -64,10 +69,52 @@ def write_fits(fname, header, data,
                           0 - ImageHDU
                           1 - BinTableHDU
     whdr                header of WAVE-TAB
+    verify              verify HDUs before writing (Default: True)
+                          False - written as is
+    use_fitsio          write image HDUs with fitsio if installed (Default: False)
+                          (float header values written with 15 digits)
     ------ OUTPUT ------
     '''
     for key, value in hdrl.items():
         header[key] = value
+    hdul = fits_hdul(header, data, wave, wmod, whdr)
+
+    if use_fitsio and fitsio is not None and data is not None and wmod==0:
+        if verify:
+            hdul.verify('exception')
+        
+        with fitsio.FITS(fname+filext, 'rw', clobber=True) as fout:
+            for hdu in hdul:
+                ## fitsio expects native byte order (FITS data read
+                ## by astropy are big-endian)
+                arr = np.asarray(hdu.data)
+                arr = arr.astype(arr.dtype.newbyteorder('='), copy=False)
+                fout.write(arr)
+                ## cfitsio adds a FITS reference as COMMENT to primary HDUs
+                for rec in fout[-1].read_header_list():
+                    if rec['name']=='COMMENT':
+                        fout[-1].delete_key('COMMENT')
+                fout[-1].write_keys(fitsio_header(hdu.header))
+    elif verify:
+        hdul.writeto(fname+filext, overwrite=True)
+    else:
+        hdul.writeto(fname+filext, overwrite=True, output_verify='ignore')
+
+def fits_hdul(header, data, wave=None, wmod=0, whdr=None):
+    '''
+    HDU list written by write_fits (primary HDU and wave table)
+
+    ------ INPUT ------
+    header              header of primary HDU
+    data                data in primary HDU
+    wave                data in table 1 (ndarray. Default: None)
+    wmod                wave table format (Default: 0)
+                          0 - ImageHDU
+                          1 - BinTableHDU
+    whdr                header of WAVE-TAB
+    ------ OUTPUT ------
+    hdul                HDUList
+    '''
     primary_hdu = fits.PrimaryHDU(header=header, data=data)
     hdul = fits.HDUList(primary_hdu)
     
@@ -89,10 +136,18 @@ def write_fits(fname, header, data,
 
         hdul.append(hdu)
 
-    hdul.writeto(fname+filext, overwrite=True)
+    return hdul
     
+def fitsio_header(header):
+    '''
+    Convert astropy header to fitsio FITSHDR
+    (structural keywords are removed by fitsio when written)
+    '''
+    return fitsio.FITSHDR([fitsio.FITSRecord(card.image)
+                           for card in header.cards])
+
 def read_fits(fname, wmod=0, instr=None, instr_auto=True,
-              uncfiles=None, filext=fitsext):
+              uncfiles=None, filext=fitsext, memmap=None):
     '''
     Read fits file (auto detect dim)
 
@@ -111,6 +166,10 @@ def read_fits(fname, wmod=0, instr=None, instr_auto=True,
                           None - auto detection (filext should be ".fits")
                           list (len=2) - asymmetric unc (full names with ".fits"!)
                           else - full name with ".fits"!
+    memmap              memory-map data arrays (Default: None)
+                          None - astropy default
+                          True - pages in only the accessed parts
+                                 (copy-on-write, file is never modified)
     ------ OUTPUT ------
     ds                  output dataset
       HDUL                header data unit list
@@ -155,7 +214,7 @@ def read_fits(fname, wmod=0, instr=None, instr_auto=True,
         ## Alternative: cannot read url
         # instr = identify_spectrum_format(filename)
     
-    with fits.open(filename) as hdul:
+    with fits.open(filename, memmap=memmap) as hdul:
         ## ds.HDUL
         ds.HDUL = hdul
         if instr=='JWST s3d':
@@ -219,7 +278,7 @@ def read_fits(fname, wmod=0, instr=None, instr_auto=True,
                 for uncf in uncfiles:
                     if Path(uncf).exists():
                         ## Read uncertainty data
-                        with fits.open(uncf) as hdul:
+                        with fits.open(uncf, memmap=memmap) as hdul:
                             unc.append(hdul[0].data)
             ## no unc
             if len(unc)==0:
@@ -260,6 +319,29 @@ def read_fits(fname, wmod=0, instr=None, instr_auto=True,
 
     return ds
 
+def read_fits_data(fname, filext=fitsext, out=None, use_fitsio=True):
+    '''
+    Read primary HDU data only
+    (no header/wave/unc parsing as read_fits)
+
+    ------ INPUT ------
+    fname               input FITS filename
+    out                 preallocated array to fill (Default: None)
+    use_fitsio          read with fitsio if installed (Default: True)
+    ------ OUTPUT ------
+    data                data in primary HDU (out if given)
+    '''
+    if use_fitsio and fitsio is not None:
+        data = fitsio.read(fname+filext, ext=0)
+    else:
+        data = fits.getdata(fname+filext, ext=0)
+
+    if out is None:
+        return data
+    else:
+        out[...] = data
+        return out
+
 def arr2tab(arr, header=None, unit='um'):
     '''
     Convert 1darray to FITS_rec
@@ -409,7 +491,8 @@ def patch_wcs_3D(fname=None, header=None, del_kw=None, filext=fitsext):
         header = hdr.copy()
     else:
         if header is not None:
-            hdr = header.copy()
+            hdr = header
+            header = hdr.copy() # input header unchanged
         else:
             UT.strike('patch_wcs_3D', 'no input.', cat='InputError')
 
@@ -14,6 +14,7 @@ AKARI data processing and analyzing
 import os
 import math
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from scipy.io import readsav
 from astropy.io import ascii
 import subprocess as SP
@@ -81,7 +82,8 @@ class cupid(IM.improve):
     def spec_build(self, filOUT=None, filRAW=None, dist=None,
                    Nx=None, Ny=32, Nsub=1, pixscale=None,
                    wmin=None, wmax=None, tmpdir=None, fiLOG=None,
-                   sig_pt=0, fill_pt='med', supix=False, swarp=False):
+                   sig_pt=0, fill_pt='med', supix=False, swarp=False,
+                   Nworkers=None):
         '''
         Build the spectral cube/slit from spectra extracted by IDL pipeline
         (see IRC_SPEC_TOOL, plot_spec_with_image)
@@ -105,6 +107,8 @@ class cupid(IM.improve):
         swarp               use SWarp to perform position shifts
                               Default: False (not support supix)
         fiLOG               build info (Default: None)
+        Nworkers            number of threads reading the subslit spectra
+                              (Default: None - half of CPUs)
         '''
         if Nx is None:
             Nx = self.slit_width
@@ -122,28 +126,28 @@ class cupid(IM.improve):
 
         ## Read spec - Ny/Nsub should be integer, or there will be a shi(f)t
         yscale = math.ceil(Ny/Nsub)
-        spec_arr = []
-        for j in range(Ny):
-            ## ATTENTION: the kw 'space_shift' in IRC pipeline follows the
-            ## focal plane array coordinates, whose x axis corresponds to
-            ## 'image_x'. That means if space_shift>0, x increases.
-            ## When we work in N3 frame coordinates, which rotates 90 deg,
-            ## if space_shift>0, y decreases.
-            ispec = Nsub - 1 - math.floor(j / yscale)
-            # ispec = math.floor(j / yscale) # inverse, see tests/test_build_slit
-            readspec = ascii.read(self.path+'spec'+str(ispec)+'.spc')
-            subslit = []
-            for k in readspec.keys():
-                subslit.append(readspec[k])
-            subslit = np.array(subslit)
-            
-            spec_arr.append(subslit)
+        ## ATTENTION: the kw 'space_shift' in IRC pipeline follows the
+        ## focal plane array coordinates, whose x axis corresponds to
+        ## 'image_x'. That means if space_shift>0, x increases.
+        ## When we work in N3 frame coordinates, which rotates 90 deg,
+        ## if space_shift>0, y decreases.
+        ispec = [Nsub - 1 - math.floor(j / yscale) for j in range(Ny)]
+        # ispec = [math.floor(j / yscale) for j in range(Ny)] # inverse, see tests/test_build_slit
+
+        ## Each subslit spec file is read once (in threads)
+        def read_subslit(i):
+            readspec = ascii.read(self.path+'spec'+str(i)+'.spc')
+            return np.array([readspec[k] for k in readspec.keys()])
+        
+        uniq = sorted(set(ispec))
+        if Nworkers is None:
+            Nworkers = max(os.cpu_count()//2, 1)
+        with ThreadPoolExecutor(max_workers=min(Nworkers, len(uniq))) as executor:
+            subslit = dict(zip(uniq, executor.map(read_subslit, uniq)))
         ## spec_arr.shape = (Ny,4,Nw)
-        spec_arr = np.array(spec_arr)
+        spec_arr = np.array([subslit[i] for i in ispec])
         ## Save spec in wave ascending order
-        for i in range(spec_arr.shape[1]):
-            for j in range(Ny):
-                spec_arr[j,i,:] = spec_arr[j,i,::-1]
+        spec_arr = spec_arr[:,:,::-1]
         wave = spec_arr[0,0,:]
         if wmin is None:
             wmin = wave[0]
@@ -154,17 +158,14 @@ class cupid(IM.improve):
         wave = wave[iwi:iws]
         Nw = len(wave)
         
-        ## Build cube array
-        cube = np.empty([Nw,Ny,1])
-        unc = np.empty([Nw,Ny,1]) # Symmetric unc
-        unc_N = np.empty([Nw,Ny,1]) # Asymmetric negtive
-        unc_P = np.empty([Nw,Ny,1]) # Asymmetric positive
-        for k in range(Nw):
-            for j in range(Ny):
-                cube[k][j] = spec_arr[j,1,k+iwi]
-                unc[k][j] = (spec_arr[j,3,k+iwi]-spec_arr[j,2,k+iwi])/2
-                unc_N[k][j] = (spec_arr[j,1,k+iwi]-spec_arr[j,2,k+iwi])
-                unc_P[k][j] = (spec_arr[j,3,k+iwi]-spec_arr[j,1,k+iwi])
+        ## Build cube array [w,y,1]
+        ## (flux, lower, upper from one contiguous transpose)
+        flux, lo, hi = np.array(spec_arr[:,1:4,iwi:iws].transpose(1,2,0),
+                                dtype=float)[:,:,:,np.newaxis]
+        cube = flux
+        unc = (hi-lo)*.5 # Symmetric unc
+        unc_N = flux-lo # Asymmetric negtive
+        unc_P = hi-flux # Asymmetric positive
 
         ## Update self variables (for next steps)
         self.reinit(header=self.hdr, image=cube, wave=wave,
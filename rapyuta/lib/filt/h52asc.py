@@ -4,6 +4,7 @@
 import sys
 from pathlib import Path
 import numpy as np
+import h5py as H5
 # from astropy.table import Table
 from astropy.io import ascii
 
@@ -14,7 +15,7 @@ except NameError:
     root = Path().absolute() / '../../..'
 sys.path.insert(0, root)
 
-from rapyuta.inout import read_hdf5, write_ascii, ascext
+from rapyuta.inout import write_ascii, ascext, h5ext
 
 ## Path
 filtdir = str(root / 'rapyuta/lib/filt')
@@ -23,9 +24,10 @@ filt = ['IRAC1', 'IRAC2', 'IRAC3', 'IRAC4',
         'WISE1', 'WISE2', 'WISE3', 'WISE4',]
 
 for f in filt:
-    ## Read
-    col1 = read_hdf5('filt_'+f, 'Filter wavelength (microns)')
-    col2 = read_hdf5('filt_'+f, 'Filter transmission')
+    ## Read (both columns with one file open)
+    with H5.File('filt_'+f+h5ext, 'r') as hf:
+        col1 = hf['Filter wavelength (microns)'][()]
+        col2 = hf['Filter transmission'][()]
     data = np.array([col1, col2])#.reshape((len(col1),2))
     # print(data.shape)
 
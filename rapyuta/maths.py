@@ -161,25 +161,26 @@ def nanavg(a, axis=None, weights=None, MaskedValue=np.nan):
     or
     Numpy.nanmean with weights
     '''
-    ## NaNs -> --
-    ma = np.ma.MaskedArray(a, mask=np.isnan(a))
-    if weights is not None:
-        wgt = np.ma.MaskedArray(weights, mask=np.isnan(a))
-    else:
-        wgt = weights
-
-    mask_any = ma.mask.any(axis=axis)
-    mask_all = ma.mask.all(axis=axis)
+    a = np.asarray(a)
+    valid = ~np.isnan(a)
 
-    avg = np.average(ma, axis=axis, weights=wgt)
+    ## Weights of NaNs -> 0
+    if weights is None:
+        wgt = valid
+    else:
+        wgt = np.where(valid, weights, 0.)
 
-    ## Check weight sums
-    # print('wgt sums: ', np.average(ma, axis=axis, weights=wgt, returned=True)[1])
+    ## One pass of plain reductions instead of masked arrays
+    num = np.sum(np.where(valid, a, 0.) * wgt, axis=axis)
+    den = np.sum(wgt, axis=axis, dtype=num.dtype)
+    mask_all = ~valid.any(axis=axis)
 
     ## Convert output none value convention (Default: NaNs)
-    if axis is not None:
-        avg = avg.data
-        avg[mask_all] = MaskedValue
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = np.where(mask_all, MaskedValue, num / np.where(mask_all, 1., den))
+
+    if axis is None:
+        avg = avg[()]
 
     return avg
 
@@ -348,26 +349,52 @@ def ij2icorr(Npar, i, j, verbose=False):
 ##
 ##------------------------------------------------
 
-def bsplinterp(x, y, x0):
+def bsplinterp(x, y, x0, k=4):
     '''
-    Monte-Carlo propagated error calculator
+    B-spline interpolation (NaNs and zeros of y are skipped)
+    
+    If y is 2D, each column is interpolated independently.
+    Columns sharing the same gaps share the knots
+    and are fitted in one batch.
     
     ------ INPUT ------
     x                   in base x
-    y                   in data y
+    y                   in data y (1D, or 2D [len(x),Ncol])
     x0                  out base x
+    k                   B-spline degree (Default: 4)
     ------ OUTPUT ------
     bspl(x0)            B-spline interpol out data
     '''
-    mask = []
-    for i, yi in enumerate(y):
-        if np.isnan(yi)==1 or yi==0:
-            mask.append(i)
-    if len(x)-len(mask)>4: # number of knots (avoid all NaNs col)
-        x = np.delete(x, mask)
-        y = np.delete(y, mask)
+    y = np.asarray(y)
+    if y.ndim==2:
+        out = np.empty((np.size(x0), y.shape[1]))
+        ## Group columns by gap pattern
+        mask = np.isnan(y) | (y==0)
+        patterns, inv = np.unique(mask.T, axis=0, return_inverse=True)
+        inv = inv.reshape(-1)
+        for g, pattern in enumerate(patterns):
+            cols = np.flatnonzero(inv==g)
+            valid = ~pattern
+            if np.sum(valid)>4:
+                ## Interpolating knots only depend on x
+                xv = np.asarray(x)[valid]
+                yv = y[valid][:,cols]
+                t = interpolate.splrep(xv, yv[:,0], s=0, k=k)[0]
+                bspl = interpolate.make_lsq_spline(xv, yv, t, k=k)
+                bspl.extrapolate = False
+                out[:,cols] = bspl(x0)
+            else:
+                for c in cols:
+                    out[:,c] = bsplinterp(x, y[:,c], x0, k=k)
+
+        return out
+    
+    mask = np.isnan(y) | (y==0)
+    if len(x)-np.sum(mask)>4: # number of knots (avoid all NaNs col)
+        x = np.delete(x, np.flatnonzero(mask))
+        y = np.delete(y, np.flatnonzero(mask))
 
-    t, c, k = interpolate.splrep(x, y, s=0, k=4) # s - smooth
+    t, c, k = interpolate.splrep(x, y, s=0, k=k) # s - smooth
     # print('''\
     # t: {}
     # c: {}
@@ -9,7 +9,7 @@ Utility box
     Error:
         InputError,
     strike, streplace_scl, streplace, tcolor, print_text
-    getcfd, maketmp, fclean
+    getcfd, maketmp, localbuff, fclean
     merge_aliases, is_different_value, codefold
 
     term_width
@@ -17,6 +17,7 @@ Utility box
 """
 
 import inspect, os, re, sys
+import atexit, shutil
 from pathlib import Path
 from urllib.parse import urlparse
 import numpy as np
@@ -52,7 +53,11 @@ def type_shell():
 
 ## term_width
 if type_shell()=='terminal':
-    term_width = int((os.popen('stty size', 'r').read().split())[1])
+    try:
+        term_width = int((os.popen('stty size', 'r').read().split())[1])
+    except IndexError:
+        ## Not attached to a terminal (pipes, test runners)
+        term_width = 80
 else:
     term_width = 80
 
@@ -430,6 +435,31 @@ def maketmp(tmpdir=None):
 
     return path_tmp
 
+def localbuff(name, shm=False, minfree=2**30):
+    '''
+    Local buffer folder for tmp files
+
+    ------ INPUT ------
+    name                tmp folder name
+    shm                 use RAM-backed /dev/shm (Default: False)
+                          avoids slow shared file systems,
+                          the folder is removed at exit
+    minfree             min free bytes to use /dev/shm (Default: 1 GiB)
+    ------ OUTPUT ------
+    path_tmp            /dev/shm/rapyuta_name_<pid>/ if shm and enough free space
+                        cwd/name/ otherwise
+    '''
+    if shm and os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        if shutil.disk_usage('/dev/shm').free>=minfree:
+            path_tmp = '/dev/shm/rapyuta_'+name+'_'+str(os.getpid())+'/'
+            os.makedirs(path_tmp, exist_ok=True)
+            ## RAM only freed once the folder is removed
+            atexit.register(shutil.rmtree, path_tmp, ignore_errors=True)
+
+            return path_tmp
+
+    return os.getcwd()+'/'+name+'/'
+
 ## Quick file cleaning
 def fclean(fname, *alert):
     '''
@@ -0,0 +1,5 @@
+# Licensed under a 3-clause BSD style license - see LICENSE
+
+## Plotting scripts, run by hand from their own directory
+collect_ignore = ['test_irc_pointing/test_irc.py',
+                  'test_irs_pointing/test_irs.py']
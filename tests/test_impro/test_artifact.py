@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+improve.artifact on a hand-made cube
+
+"""
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from rapyuta.inout import write_fits
+from rapyuta.impro import improve
+
+Nw, Ny, Nx = 6, 5, 5
+wave = np.arange(Nw) + 5.
+
+## Clean planes 10, 11, ..., 15
+clean = 10. + np.arange(Nw)[:,np.newaxis,np.newaxis] * np.ones((Ny,Nx))
+## Isolated spikes: (w,y,x), sign
+spikes = [((2,1,1), 1), ((3,3,0), -1), ((0,0,4), 1), ((Nw-1,4,4), 1)]
+## Extended feature: 3 flagged pixels with y+x=4 (kept for cmin<=3)
+cluster = [(4,1,3), (4,2,2), (4,3,1)]
+
+def make(tmp_path):
+    images = clean.copy()
+    for pix, sign in spikes:
+        images[pix] += sign * 50.
+    for pix in cluster:
+        images[pix] += 50.
+    unc = np.full((Nw,Ny,Nx), .1)
+    func = str(tmp_path / 'unc')
+    write_fits(func, fits.Header(), unc, wave)
+
+    header = fits.Header()
+    header.update(NAXIS=3, NAXIS1=Nx, NAXIS2=Ny, NAXIS3=Nw,
+                  CTYPE1='RA---TAN', CTYPE2='DEC--TAN', CTYPE3='WAVE',
+                  CRPIX1=3., CRPIX2=3., CRVAL1=10., CRVAL2=20.,
+                  CDELT1=-1e-3, CDELT2=1e-3, CUNIT3='um')
+
+    return header, images, func+'.fits'
+
+@pytest.mark.parametrize('fltr_pn', [None, 'p', 'n'])
+@pytest.mark.parametrize('cmin', [2, 5])
+@pytest.mark.parametrize('wrange', [(None,None), (6.,9.)])
+def test_artifact(fltr_pn, cmin, wrange, tmp_path):
+    header, images, func = make(tmp_path)
+    im = improve(header=header, images=images.copy(), wave=wave)
+    out = im.artifact(filUNC=func, wmin=wrange[0], wmax=wrange[1],
+                      lim_unc=100., fltr_pn=fltr_pn, cmin=cmin)
+
+    ## Cleaned: mean of the neighbouring planes (the clean value),
+    ## or the only neighbour at both ends of the spectrum
+    expected = clean.copy()
+    expected[0,0,4] = clean[1,0,4]
+    expected[Nw-1,4,4] = clean[Nw-2,4,4]
+    ## Left untouched: filtered sign, out of wrange (w=1..4), cluster
+    for pix, sign in spikes:
+        if (fltr_pn=='p' and sign<0) or (fltr_pn=='n' and sign>0) or \
+           (wrange[0] is not None and pix[0] in (0,Nw-1)):
+            expected[pix] = images[pix]
+    if cmin<=len(cluster) or fltr_pn=='n':
+        for pix in cluster:
+            expected[pix] = images[pix]
+    assert np.array_equal(out, expected)
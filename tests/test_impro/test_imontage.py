@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+imontage on a WAVE-TAB cube (wavelength table out of the header),
+cube coadd against the per-slice reproject_and_coadd
+
+"""
+
+from pathlib import Path
+import numpy as np
+import pytest
+from astropy.io import fits
+from reproject import reproject_interp
+from reproject.mosaicking import reproject_and_coadd
+
+from rapyuta.inout import read_fits, write_fits, patch_wcs_3D
+from rapyuta.impro import imontage
+
+path_lib = str(Path(__file__).parent.absolute() / '../lib')+'/'
+filIN = path_lib+'M82_04_SL1'
+
+@pytest.fixture
+def tab():
+    ds = read_fits(filIN)
+    assert ds.header['CTYPE3']=='WAVE-TAB'
+    ## Same wavelengths, frame shifted by a fraction of pixel
+    refheader = ds.header.copy()
+    refheader['CRPIX1'] += 3.3
+    refheader['CRPIX2'] -= 1.7
+    ## Reference: celestial reprojection of some slices
+    w2D = patch_wcs_3D(header=ds.header).wcs
+    ref2D = patch_wcs_3D(header=refheader).wcs
+    shape_out = (refheader['NAXIS2'], refheader['NAXIS1'])
+    slices = {k: reproject_interp((ds.data[k], w2D), ref2D,
+                                  shape_out=shape_out)[0]
+              for k in [0, 50, ds.Nw-1]}
+
+    return refheader, slices
+
+def test_reproject_tab(tab, tmp_path):
+    refheader, slices = tab
+    mtg = imontage('interp', tmpdir=str(tmp_path)+'/')
+    im = mtg.reproject(filIN, refheader)[0]
+    for k, sl in slices.items():
+        assert np.allclose(im[k], sl, equal_nan=True)
+    ## Input of the last file kept, output written to the tmp path
+    assert mtg.filIN==filIN and mtg.Nw==im.shape[0]
+    assert np.array_equal(read_fits(str(tmp_path)+'/M82_04_SL1_rep').data,
+                          im, equal_nan=True)
+
+def test_reproject_mc_tab(tab, tmp_path):
+    refheader, slices = tab
+    mtg = imontage('interp', tmpdir=str(tmp_path)+'/')
+    ds = mtg.reproject_mc(filIN, refheader, dist='norm', Nmc=2, seed=0)
+    for k, sl in slices.items():
+        assert np.allclose(ds.data[k], sl, equal_nan=True)
+    assert ds.unc.shape==ds.data.shape
+    assert np.isfinite(ds.unc).any()
+
+def test_coadd_cube(tmp_path):
+    ## Two overlapping cubes (shifted frames, with a NaN hole)
+    Nw, Ny, Nx = 4, 10, 12
+    wave = np.arange(Nw) + 5.
+    yy, xx = np.mgrid[:Ny,:Nx]
+    flist = []
+    for i, (crpix1, crpix2) in enumerate([(5., 5.), (8.4, 3.3)]):
+        header = fits.Header()
+        header.update(NAXIS=3, NAXIS1=Nx, NAXIS2=Ny, NAXIS3=Nw,
+                      CTYPE1='RA---TAN', CTYPE2='DEC--TAN',
+                      CRPIX1=crpix1, CRPIX2=crpix2, CRVAL1=10., CRVAL2=20.,
+                      CDELT1=-1e-3, CDELT2=1e-3)
+        cube = np.array([np.sin(xx/3.+k) + (i+1)*np.cos(yy/4.) + 3.
+                         for k in range(Nw)])
+        cube[1,2:4,3:6] = np.nan
+        flist.append(str(tmp_path / ('cube'+str(i))))
+        write_fits(flist[-1], header, cube, wave)
+    refheader = fits.Header()
+    refheader.update(NAXIS=2, NAXIS1=16, NAXIS2=12,
+                     CTYPE1='RA---TAN', CTYPE2='DEC--TAN',
+                     CRPIX1=7.2, CRPIX2=4.1, CRVAL1=10., CRVAL2=20.,
+                     CDELT1=-1e-3, CDELT2=1e-3)
+
+    ds = imontage('interp', tmpdir=str(tmp_path)+'/').coadd(flist, refheader)
+    inputs = [read_fits(f) for f in flist]
+    for k in range(Nw):
+        ref = reproject_and_coadd(
+            [(d.data[k], patch_wcs_3D(header=d.header).wcs) for d in inputs],
+            refheader, reproject_function=reproject_interp)[0]
+        assert np.allclose(ds.data[k], ref)
+    assert np.array_equal(ds.wave, wave)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+interfill on cubic polynomials (reproduced exactly by the B-splines)
+
+"""
+
+import numpy as np
+import pytest
+
+from rapyuta.impro import interfill
+
+@pytest.mark.parametrize('shape, axis', [((12,), 0),
+                                         ((12,9), 0), ((9,12), 1),
+                                         ((12,5,6), 0), ((5,12,6), 1),
+                                         ((5,6,12), 2)])
+def test_interfill(shape, axis):
+    rng = np.random.default_rng(1)
+    ## One cubic per vector, strictly positive on x=0..11
+    x = np.arange(shape[axis])
+    lead = shape[:axis] + shape[axis+1:]
+    a = rng.uniform(.01, .1, lead)[...,np.newaxis]
+    b = rng.uniform(-1., 1., lead)[...,np.newaxis]
+    expected = np.moveaxis(a*x**3 + b*x + 20., -1, axis)
+
+    arr = expected.copy()
+    ## Gaps (NaNs and zeros) inside some of the vectors
+    vecs = np.moveaxis(arr, axis, -1)
+    gaps = rng.random(lead)<0.5
+    vecs[gaps, 3] = np.nan
+    vecs[gaps, 7] = 0.
+    vecs[..., 5][rng.random(lead)<0.3] = np.nan
+    assert np.isnan(arr).any()
+    assert np.allclose(interfill(arr, axis, Nworkers=2), expected)
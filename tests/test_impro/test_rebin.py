@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+improve.rebin on hand-computed ramps,
+NaN propagation (integer and fractional ratios)
+
+"""
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from rapyuta.impro import improve, rebin_frac
+
+## Power of 2 pixel scale: exact pixscale ratios
+cdelt = 2.**-12 # deg
+Ny, Nx = 12, 15
+jnan, inan = 5, 7
+
+def make(Nw=None):
+    header = fits.Header()
+    header['NAXIS'] = 2
+    header['NAXIS1'] = Nx
+    header['NAXIS2'] = Ny
+    header.update(CTYPE1='RA---TAN', CTYPE2='DEC--TAN',
+                  CRPIX1=7., CRPIX2=6., CRVAL1=10., CRVAL2=20.,
+                  CDELT1=-cdelt, CDELT2=cdelt)
+    images = np.arange(Ny*Nx, dtype=float).reshape(Ny,Nx) + 1.
+    if Nw is not None:
+        images = np.repeat(images[np.newaxis], Nw, axis=0)
+    images[..., jnan, inan] = np.nan
+
+    return improve(header=header, images=images)
+
+## Column ramps: new pixels are (fractional) box sums/means
+ramp3 = np.tile([1., 2., 3.], (3,1))
+ramp4 = np.tile([1., 2., 3., 4.], (4,1))
+
+@pytest.mark.parametrize('Nw', [None, 3])
+@pytest.mark.parametrize('oldimage, ratio, total, extrapol, expected', [
+    ## 1.5 old pixels per new pixel: (1 + 2/2)/1.5, (2/2 + 3)/1.5
+    (ramp3, 1.5, False, False, [[4/3, 8/3], [4/3, 8/3]]),
+    (ramp3, 1.5, True, False, [[3., 6.], [3., 6.]]),
+    ## Integer ratio: 2x2 box means/sums
+    (ramp4, 2., False, False, [[1.5, 3.5], [1.5, 3.5]]),
+    (ramp4, 2., True, False, [[6., 14.], [6., 14.]]),
+    ## Last new pixels half outside: divided by the full box...
+    (ramp3, 2., False, False, [[1.5, 1.5], [.75, .75]]),
+    (ramp3, 2., True, False, [[6., 6.], [3., 3.]]),
+    ## ...or by the covered part with extrapol
+    (ramp3, 2., False, True, [[1.5, 3.], [1.5, 3.]]),
+])
+def test_values(oldimage, ratio, total, extrapol, expected, Nw):
+    header = fits.Header()
+    header['NAXIS'] = 2
+    header['NAXIS1'] = oldimage.shape[1]
+    header['NAXIS2'] = oldimage.shape[0]
+    header.update(CTYPE1='RA---TAN', CTYPE2='DEC--TAN',
+                  CRPIX1=2., CRPIX2=2., CRVAL1=10., CRVAL2=20.,
+                  CDELT1=-cdelt, CDELT2=cdelt)
+    images = oldimage.copy()
+    if Nw is not None:
+        images = np.repeat(images[np.newaxis], Nw, axis=0)
+    newimage = improve(header=header, images=images).rebin(
+        pixscale=ratio*cdelt*3600., total=total, extrapol=extrapol)
+    assert np.allclose(newimage, np.broadcast_to(expected, newimage.shape))
+
+@pytest.mark.parametrize('ratio', [0.7, 1.5, 2., 3.])
+def test_cover(ratio):
+    ## Only non-zero fractions are covered
+    N = int(np.ceil(Nx/ratio))
+    box, cover = rebin_frac(N, Nx, ratio)
+    assert np.array_equal(cover, box!=0)
+
+@pytest.mark.parametrize('Nw', [None, 3])
+@pytest.mark.parametrize('ratio', [0.7, 1.5, 2., 3.])
+def test_nan(ratio, Nw):
+    ## NaN where the NaN pixel has a non-zero fraction, for all ratios
+    ## (integer ratios take the box summing path)
+    im = make(Nw)
+    newimage = im.rebin(pixscale=ratio*cdelt*3600.)
+    ybox, _ = rebin_frac(newimage.shape[-2], Ny, ratio)
+    xbox, _ = rebin_frac(newimage.shape[-1], Nx, ratio)
+    expected = np.outer(ybox[:,jnan], xbox[:,inan])!=0
+    assert np.array_equal(np.isnan(newimage),
+                          np.broadcast_to(expected, newimage.shape))
+
+@pytest.mark.parametrize('ratio', [2., 3.])
+def test_integer(ratio):
+    ## Box summing equals the fraction tables
+    old = make().images
+    newimage = make().rebin(pixscale=ratio*cdelt*3600., total=True)
+    ybox, ycover = rebin_frac(newimage.shape[0], Ny, ratio)
+    xbox, xcover = rebin_frac(newimage.shape[1], Nx, ratio)
+    expected = ybox @ np.nan_to_num(old) @ xbox.T
+    expected[ycover @ np.isnan(old) @ xcover.T > 0] = np.nan
+    assert np.allclose(newimage, expected, equal_nan=True)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+wclean on hand-traced crossings, with the archived indices
+
+"""
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from rapyuta.inout import write_fits
+from rapyuta.impro import wclean
+
+## Two crossings: segment 2..7 (3, 4, 5 | 2.2, 3.2, 4.2)
+## and segment 10..11 (7 | 6.5)
+wave = np.array([1., 2., 3., 4., 5., 2.2, 3.2, 4.2, 5.2, 6., 7., 6.5, 8.])
+Nw = len(wave)
+
+@pytest.fixture
+def cube(tmp_path):
+    header = fits.Header()
+    header.update(NAXIS=3, NAXIS1=4, NAXIS2=3, NAXIS3=Nw)
+    data = np.random.default_rng(0).random((Nw,3,4))
+    fname = str(tmp_path / 'cube')
+    write_fits(fname, header, data, wave)
+
+    return fname, data
+
+## Indices of removed wvl
+@pytest.mark.parametrize('cmod, ind', [
+    ('all', [2, 3, 4, 5, 6, 7, 10, 11]),
+    ('eq', [3, 4, 5, 10, 11]),
+    ('closest_left', [5, 6, 7, 11]),
+    ('closest_right', [2, 3, 4, 10]),
+])
+def test_wclean(cube, cmod, ind, tmp_path):
+    fname, data = cube
+    data_new, wave_new = wclean(fname, cmod=cmod, filOUT=str(tmp_path / 'out'))
+    assert np.array_equal(data_new, np.delete(data, ind, axis=0))
+    assert np.array_equal(wave_new, np.delete(wave, ind))
+
+    ## Archived indices give the same cleaning
+    data_arx, wave_arx = wclean(fname, cfile=str(tmp_path / 'out_wclean_info'))
+    assert np.array_equal(data_arx, data_new)
+    assert np.array_equal(wave_arx, wave_new)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Write-then-read roundtrips of the test FITS files
+
+"""
+
+from pathlib import Path
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from rapyuta.inout import read_fits, read_fits_data, write_fits, fitsio
+
+path_lib = str(Path(__file__).parent.absolute() / '../lib')+'/'
+files = ['M82_SL1', 'IC10_SL2', 'M82_IRAC4', 'M82_template']
+backends = [False,
+            pytest.param(True, marks=pytest.mark.skipif(
+                fitsio is None, reason='fitsio not installed'))]
+
+## Keywords set by the writer (comments differ between astropy and cfitsio)
+structural = ['SIMPLE', 'BITPIX', 'EXTEND', 'XTENSION', 'PCOUNT', 'GCOUNT']
+
+def cards(header, digits=None):
+    ## Float values rounded to digits significant digits if set
+    ## (fitsio writes them with 15)
+    def value(v):
+        if digits is not None and isinstance(v, float):
+            return float('{:.{}g}'.format(v, digits))
+        return v
+    return [(card.keyword, str(value(card.value)), card.comment)
+            for card in header.cards
+            if card.keyword not in structural and
+            not card.keyword.startswith('NAXIS')]
+
+@pytest.mark.parametrize('use_fitsio', backends)
+@pytest.mark.parametrize('name', files)
+def test_roundtrip(name, use_fitsio, tmp_path):
+    ds = read_fits(path_lib+name)
+    fout = str(tmp_path / name)
+    write_fits(fout, ds.header.copy(), ds.data, ds.wave,
+               use_fitsio=use_fitsio)
+
+    ## Data & wave
+    ds2 = read_fits(fout)
+    assert np.array_equal(ds2.data, ds.data, equal_nan=True)
+    if ds.wave is None:
+        assert ds2.wave is None
+    else:
+        assert np.array_equal(ds2.wave, ds.wave)
+    assert np.array_equal(read_fits_data(fout, use_fitsio=use_fitsio),
+                          ds.data, equal_nan=True)
+
+    ## Headers (astropy: values not re-formatted,
+    ## blank/COMMENT cards kept)
+    digits = 15 if use_fitsio else None
+    with fits.open(path_lib+name+'.fits') as hdul, \
+         fits.open(fout+'.fits') as hdul2:
+        assert cards(hdul2[0].header, digits)==cards(hdul[0].header, digits)
+        if not use_fitsio:
+            assert hdul2[0].header['CRVAL1']==hdul[0].header['CRVAL1']
+
+@pytest.mark.parametrize('use_fitsio', backends)
+def test_verify(use_fitsio, tmp_path):
+    ## Non-standard card rejected before anything is written (default)
+    header = fits.Header([fits.Card.fromstring('BADKEY? = 1')])
+    with pytest.raises(fits.verify.VerifyError):
+        write_fits(str(tmp_path / 'verified'), header, np.ones((2,3)),
+                   use_fitsio=use_fitsio)
+    assert not (tmp_path / 'verified.fits').exists()
+
+def test_noverify(tmp_path):
+    ## astropy writes it as is when not verified
+    ## (cfitsio refuses illegal keywords by itself)
+    header = fits.Header([fits.Card.fromstring('BADKEY? = 1')])
+    write_fits(str(tmp_path / 'ignored'), header, np.ones((2,3)),
+               use_fitsio=False, verify=False)
+    assert (tmp_path / 'ignored.fits').exists()
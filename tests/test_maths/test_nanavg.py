@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+nanavg on a hand-computed array
+
+"""
+
+import numpy as np
+import pytest
+
+from rapyuta.maths import nanavg
+
+a = np.array([[1., np.nan, 3.],
+              [np.nan, np.nan, 6.]])
+w = np.array([[1., 2., 3.],
+              [4., 5., 1.]])
+
+@pytest.mark.parametrize('axis, weights, expected', [
+    (None, None, 10/3),
+    (None, w, (1.+9.+6.)/5),
+    (0, None, [1., np.nan, 4.5]),
+    (0, w, [1., np.nan, (9.+6.)/4]),
+    (1, None, [2., 6.]),
+    (1, w, [(1.+9.)/4, 6.]),
+])
+def test_nanavg(axis, weights, expected):
+    assert np.allclose(nanavg(a, axis=axis, weights=weights), expected,
+                       equal_nan=True)
+
+def test_masked_value():
+    assert np.allclose(nanavg(a, axis=0, MaskedValue=-1.), [1., -1., 4.5])
+    ## All-NaN input
+    assert np.isnan(nanavg(a[:,1]))
+    assert np.ndim(nanavg(a)) == 0